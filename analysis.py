@@ -0,0 +1,567 @@
+"""
+@title : Analysis
+@description : Exports the timelines of a solution (drones, orders, warehouses), renders them, and compares two
+               solutions turn by turn
+"""
+
+from parser import parse_challenge, parse_solution
+from utils.Challenge import Challenge
+from utils.ActionBuffer import ActionBuffer, LOAD, UNLOAD, DELIVER, WAIT, COMMANDS
+from math import ceil
+import csv
+import json
+import os
+
+# Formats of the exported tables (Parquet needs pyarrow)
+FORMATS = ['csv', 'json', 'parquet']
+
+# Length of the turn windows in which the activity of the warehouses is counted
+HOTSPOT_WINDOW = 100
+
+# Amount of orders listed in the summary of a comparison (the biggest gains and losses)
+DIFF_TOP = 5
+
+
+def drone_events(solution: ActionBuffer, challenge: Challenge) -> list[dict]:
+    """
+        - Replays the actions of every drone (turns counted like score_solution): the drone starts flying at 'start',
+          arrives at 'arrival' and its action is over at 'end' (a delivery counts at its arrival turn)
+        :return:        One event per action, drone by drone
+    """
+    warehouses = {w.id: w.location for w in challenge.warehouses}
+    orders = {o.id: o.location for o in challenge.orders}
+    events = []
+
+    for drone in challenge.drones:
+        turn = 0
+        location = challenge.warehouses[0].location
+
+        for index, (_, opcode, target, product, quantity) in enumerate(solution.for_drone(drone.id).rows()):
+            if opcode == WAIT:
+                arrival, end = turn, turn + target
+            else:
+                destination = orders[target] if opcode == DELIVER else warehouses[target]
+                arrival = turn + Challenge.calculate_distance(location, destination)
+                end = arrival + 1
+                location = destination
+
+            events.append({
+                'drone': drone.id, 'index': index, 'command': COMMANDS[opcode], 'target': target,
+                'product': product if opcode != WAIT else None, 'quantity': quantity if opcode != WAIT else None,
+                'start': turn, 'arrival': arrival, 'end': end,
+            })
+            turn = end
+
+    return events
+
+
+def drone_utilisation(events: list[dict], challenge: Challenge) -> list[dict]:
+    """
+        - Splits the turns of each drone between flying, loading (or unloading), delivering, waiting and idle (after
+          its last action, until the deadline)
+        :return:        One row per drone
+    """
+    rows = {drone.id: {'drone': drone.id, 'actions': 0, 'flying': 0, 'loading': 0, 'delivering': 0, 'waiting': 0,
+                       'idle': challenge.deadline, 'end': 0, 'overrun': 0, 'utilisation': 0.0}
+            for drone in challenge.drones}
+
+    for event in events:
+        row = rows[event['drone']]
+        row['actions'] += 1
+        row['end'] = event['end']
+
+        if event['command'] == COMMANDS[WAIT]:
+            row['waiting'] += event['end'] - event['start']
+            continue
+
+        row['flying'] += event['arrival'] - event['start']
+        row['delivering' if event['command'] == COMMANDS[DELIVER] else 'loading'] += 1
+
+    for row in rows.values():
+        row['idle'] = max(0, challenge.deadline - row['end'])
+        row['overrun'] = max(0, row['end'] - challenge.deadline)
+        busy = row['flying'] + row['loading'] + row['delivering']
+        row['utilisation'] = round(busy / challenge.deadline, 4)
+
+    return list(rows.values())
+
+
+def drone_states(events: list[dict], challenge: Challenge) -> list[dict]:
+    """
+        - Describes what each drone does at every turn, as intervals of turns [start, end) with the same activity
+          (flying, loading, unloading, delivering, waiting, idle) and place (the warehouse or the order it flies to
+          or works at), from turn 0 until the deadline (or until its last action, if it ends later)
+        :return:        One row per interval, drone by drone
+    """
+    activities = {COMMANDS[LOAD]: 'loading', COMMANDS[UNLOAD]: 'unloading', COMMANDS[DELIVER]: 'delivering',
+                  COMMANDS[WAIT]: 'waiting'}
+    rows = []
+
+    def add(drone_id: int, start: int, end: int, activity: str, place: str | None) -> None:
+        # Empty intervals (flights of 0 turns) are skipped, and the same state continued is merged
+        if end <= start:
+            return
+        if rows and rows[-1]['drone'] == drone_id and rows[-1]['end'] == start and \
+                (rows[-1]['activity'], rows[-1]['place']) == (activity, place):
+            rows[-1]['end'] = end
+        else:
+            rows.append({'drone': drone_id, 'start': start, 'end': end, 'activity': activity, 'place': place})
+
+    events_by_drone = {drone.id: [] for drone in challenge.drones}
+    for event in events:
+        events_by_drone[event['drone']].append(event)
+
+    for drone in challenge.drones:
+        turn = 0
+
+        for event in events_by_drone[drone.id]:
+            place = None
+            if event['command'] != COMMANDS[WAIT]:
+                place = f'{"order" if event["command"] == COMMANDS[DELIVER] else "warehouse"} {event["target"]}'
+
+            add(drone.id, event['start'], event['arrival'], 'flying', place)
+            add(drone.id, event['arrival'], event['end'], activities[event['command']], place)
+            turn = event['end']
+
+        add(drone.id, turn, challenge.deadline, 'idle', None)
+
+    return rows
+
+
+def order_completions(events: list[dict], challenge: Challenge) -> list[dict]:
+    """
+        - Finds the turn at which each order is completed, and the points it gives, with the accounting of
+          score_solution: the deliveries are replayed drone by drone (the order of drone_events, not by turn), the
+          turn of an order being the latest turn of its deliveries until it is completed, and an order receiving
+          more units of a product than it needs (or a product it does not need) is not completed
+        :return:        One row per order (completion and points are None if the order is not completed)
+    """
+    # (order, product) -> amount still needed (negative when too many units are delivered)
+    remaining = {(o.id, p): q for o in challenge.orders for p, q in o.products.items()}
+    # Order -> amount of products not delivered exactly yet
+    unfinished = {o.id: sum(1 for q in o.products.values() if q != 0) for o in challenge.orders}
+    # Orders already completed once (their later deliveries do not change their turn)
+    completed = set()
+    rows = {o.id: {'order': o.id, 'x': o.location[0], 'y': o.location[1], 'items': sum(o.products.values()),
+                   'deliveries': 0, 'first_delivery': None, 'completion': None, 'points': None}
+            for o in challenge.orders}
+
+    for event in events:
+        if event['command'] != COMMANDS[DELIVER]:
+            continue
+
+        order_id, key = event['target'], (event['target'], event['product'])
+        row = rows[order_id]
+
+        row['deliveries'] += 1
+        if row['first_delivery'] is None or event['arrival'] < row['first_delivery']:
+            row['first_delivery'] = event['arrival']
+
+        if order_id not in completed and (row['completion'] is None or event['arrival'] > row['completion']):
+            row['completion'] = event['arrival']
+
+        before = remaining.get(key, 0)
+        remaining[key] = before - event['quantity']
+        unfinished[order_id] += (before == 0) - (remaining[key] == 0)
+
+        if unfinished[order_id] == 0:
+            completed.add(order_id)
+
+    for row in rows.values():
+        # A later extra delivery cancels the completion
+        if unfinished[row['order']] != 0:
+            row['completion'] = None
+        elif row['completion'] is not None:
+            row['points'] = ceil((challenge.deadline - row['completion']) / challenge.deadline * 100)
+
+    return list(rows.values())
+
+
+def warehouse_activity(events: list[dict], challenge: Challenge, window: int = HOTSPOT_WINDOW) -> list[dict]:
+    """
+        - Counts the loads of each warehouse in windows of turns (the hot spots are the busiest cells)
+        :return:        One row per warehouse and window with at least one load
+    """
+    cells = {}
+
+    for event in events:
+        if event['command'] not in (COMMANDS[LOAD], COMMANDS[UNLOAD]):
+            continue
+
+        key = (event['target'], event['arrival'] // window * window)
+        cell = cells.setdefault(key, {'warehouse': key[0], 'window_start': key[1], 'loads': 0, 'units': 0,
+                                      'drones': set()})
+        cell['loads'] += 1
+        cell['units'] += event['quantity']
+        cell['drones'].add(event['drone'])
+
+    rows = []
+    for key in sorted(cells):
+        cell = cells[key]
+        cell['drones'] = len(cell['drones'])
+        rows.append(cell)
+
+    return rows
+
+
+def warehouse_hotspots(activity: list[dict], challenge: Challenge) -> list[dict]:
+    """
+        - Sums the activity of each warehouse, with its busiest window of turns
+        :return:        One row per warehouse, the busiest first
+    """
+    rows = {w.id: {'warehouse': w.id, 'x': w.location[0], 'y': w.location[1], 'loads': 0, 'units': 0,
+                   'peak_window': None, 'peak_loads': 0}
+            for w in challenge.warehouses}
+
+    for cell in activity:
+        row = rows[cell['warehouse']]
+        row['loads'] += cell['loads']
+        row['units'] += cell['units']
+
+        if cell['loads'] > row['peak_loads']:
+            row['peak_window'], row['peak_loads'] = cell['window_start'], cell['loads']
+
+    return sorted(rows.values(), key=lambda r: -r['loads'])
+
+
+def analyse(solution: ActionBuffer, challenge: Challenge) -> dict[str, list[dict]]:
+    """
+        - Builds every table of the analysis of a solution
+        :return:        The tables, by name
+    """
+    events = drone_events(solution, challenge)
+    activity = warehouse_activity(events, challenge)
+
+    return {
+        'timeline': events,
+        'drone_states': drone_states(events, challenge),
+        'utilisation': drone_utilisation(events, challenge),
+        'orders': order_completions(events, challenge),
+        'warehouse_activity': activity,
+        'hotspots': warehouse_hotspots(activity, challenge),
+    }
+
+
+def diff_solutions(first: dict[str, list[dict]], second: dict[str, list[dict]]) -> dict[str, list[dict]]:
+    """
+        - Compares the analysis of two solutions: the completion turn of each order, the turns of each drone (a
+          negative delta means the second solution is earlier), and the timelines of the drones turn by turn (see
+          timeline_diff)
+        :return:        The tables of the differences, by name
+    """
+    orders = []
+
+    for a, b in zip(first['orders'], second['orders']):
+        if a['completion'] is None and b['completion'] is None:
+            status = 'unfinished'
+        elif a['completion'] is None:
+            status = 'gained'
+        elif b['completion'] is None:
+            status = 'lost'
+        else:
+            status = 'earlier' if b['completion'] < a['completion'] else \
+                'later' if b['completion'] > a['completion'] else 'same'
+
+        both = a['completion'] is not None and b['completion'] is not None
+        orders.append({
+            'order': a['order'], 'status': status, 'completion_a': a['completion'], 'completion_b': b['completion'],
+            'delta': b['completion'] - a['completion'] if both else None,
+            'points_delta': (b['points'] or 0) - (a['points'] or 0),
+        })
+
+    timelines = timeline_diff(first['drone_states'], second['drone_states'])
+    drones = []
+
+    for a, b in zip(first['utilisation'], second['utilisation']):
+        row = {'drone': a['drone']}
+        for column in ('actions', 'flying', 'loading', 'delivering', 'waiting', 'idle', 'end'):
+            row[f'{column}_a'], row[f'{column}_b'] = a[column], b[column]
+            row[f'{column}_delta'] = b[column] - a[column]
+
+        # First turn at which the drone does something else, and amount of turns it does
+        differences = [interval for interval in timelines if interval['drone'] == a['drone']]
+        row['diverges_at'] = differences[0]['start'] if differences else None
+        row['different_turns'] = sum(interval['turns'] for interval in differences)
+        drones.append(row)
+
+    return {'order_diff': orders, 'drone_diff': drones, 'timeline_diff': timelines}
+
+
+def timeline_diff(first: list[dict], second: list[dict]) -> list[dict]:
+    """
+        - Compares the states of the drones in two solutions (see drone_states) turn by turn: the turns at which a
+          drone has another activity or place are given as intervals [start, end), with the state of the drone in
+          each solution (a drone is idle after the end of its timeline)
+        :return:        One row per interval of different turns, drone by drone
+    """
+    def by_drone(states: list[dict]) -> dict[int, list[dict]]:
+        drones = {}
+        for state in states:
+            drones.setdefault(state['drone'], []).append(state)
+        return drones
+
+    first, second = by_drone(first), by_drone(second)
+    idle = {'activity': 'idle', 'place': None}
+    rows = []
+
+    for drone_id in sorted(set(first) | set(second)):
+        a, b = first.get(drone_id, []), second.get(drone_id, [])
+        end = max(a[-1]['end'] if a else 0, b[-1]['end'] if b else 0)
+        i = j = turn = 0
+
+        # Sweeping the bounds of the intervals of both timelines
+        while turn < end:
+            state_a = a[i] if i < len(a) else idle
+            state_b = b[j] if j < len(b) else idle
+            bound = min(a[i]['end'] if i < len(a) else end, b[j]['end'] if j < len(b) else end)
+
+            if (state_a['activity'], state_a['place']) != (state_b['activity'], state_b['place']):
+                row = {'drone': drone_id, 'start': turn, 'end': bound, 'turns': bound - turn,
+                       'activity_a': state_a['activity'], 'place_a': state_a['place'],
+                       'activity_b': state_b['activity'], 'place_b': state_b['place']}
+                previous = rows[-1] if rows else None
+
+                # The same difference continued is merged
+                if previous is not None and previous['drone'] == drone_id and previous['end'] == turn and \
+                        all(previous[k] == row[k] for k in ('activity_a', 'place_a', 'activity_b', 'place_b')):
+                    previous['end'], previous['turns'] = bound, previous['turns'] + row['turns']
+                else:
+                    rows.append(row)
+
+            turn = bound
+            if i < len(a) and a[i]['end'] == bound:
+                i += 1
+            if j < len(b) and b[j]['end'] == bound:
+                j += 1
+
+    return rows
+
+
+def format_summary(tables: dict[str, list[dict]]) -> str:
+    """
+        - Formats the main figures of an analysis
+        :return:        The summary
+    """
+    utilisation = tables['utilisation']
+    orders = tables['orders']
+    completed = [o for o in orders if o['completion'] is not None]
+    hottest = tables['hotspots'][0] if tables['hotspots'] else None
+
+    lines = [
+        f'Score : {sum(o["points"] for o in completed)}',
+        f'Completed orders : {len(completed)} / {len(orders)}' + (
+            f' (last at turn {max(o["completion"] for o in completed)})' if completed else ''),
+        f'Drone turns : flying {sum(r["flying"] for r in utilisation)}'
+        f', loading {sum(r["loading"] for r in utilisation)}'
+        f', delivering {sum(r["delivering"] for r in utilisation)}, waiting {sum(r["waiting"] for r in utilisation)}'
+        f', idle {sum(r["idle"] for r in utilisation)}',
+        f'Mean utilisation : {sum(r["utilisation"] for r in utilisation) / max(1, len(utilisation)) * 100:.1f}%',
+    ]
+
+    if hottest is not None:
+        lines.append(f'Busiest warehouse : {hottest["warehouse"]} ({hottest["loads"]} loads, '
+                     f'peak of {hottest["peak_loads"]} loads from turn {hottest["peak_window"]})')
+
+    return '\n'.join(lines)
+
+
+def format_diff(diff: dict[str, list[dict]], top: int = DIFF_TOP) -> str:
+    """
+        - Formats the differences between two solutions: the orders gained or lost, and the biggest changes
+        :return:        The summary
+    """
+    orders = diff['order_diff']
+    statuses = {}
+    for row in orders:
+        statuses[row['status']] = statuses.get(row['status'], 0) + 1
+
+    lines = [
+        f'Points delta : {sum(row["points_delta"] for row in orders):+d}',
+        'Orders : ' + ', '.join(f'{count} {status}' for status, count in sorted(statuses.items())),
+        f'Flying turns delta : {sum(row["flying_delta"] for row in diff["drone_diff"]):+d}',
+    ]
+
+    # Turn by turn comparison of the timelines of the drones
+    diverging = [row for row in diff['drone_diff'] if row['diverges_at'] is not None]
+    if diverging:
+        first = min(diverging, key=lambda row: row['diverges_at'])
+        lines.append(f'Drone timelines : {sum(row["different_turns"] for row in diverging)} different turns on '
+                     f'{len(diverging)} / {len(diff["drone_diff"])} drones, first at turn {first["diverges_at"]} '
+                     f'(drone {first["drone"]})')
+    else:
+        lines.append('Drone timelines : identical')
+
+    changed = sorted((row for row in orders if row['points_delta'] != 0), key=lambda row: row['points_delta'])
+    if changed:
+        lines.append('Biggest losses : ' + ', '.join(
+            f'order {row["order"]} ({row["points_delta"]:+d})' for row in changed[:top] if row['points_delta'] < 0))
+        lines.append('Biggest gains : ' + ', '.join(
+            f'order {row["order"]} ({row["points_delta"]:+d})' for row in changed[::-1][:top]
+            if row['points_delta'] > 0))
+
+    return '\n'.join(lines)
+
+
+def export_tables(tables: dict[str, list[dict]], directory: str, file_format: str = 'csv') -> list[str]:
+    """
+        - Writes every table in a directory, as CSV, JSON (columns and rows, without repeating the keys) or Parquet
+        :return:        The written files
+    """
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+
+    for name, rows in tables.items():
+        filename = os.path.join(directory, f'{name}.{file_format}')
+        columns = list(rows[0].keys()) if rows else []
+
+        if file_format == 'csv':
+            with open(filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(rows)
+
+        elif file_format == 'json':
+            with open(filename, 'w') as f:
+                json.dump({'columns': columns, 'rows': [[row[c] for c in columns] for row in rows]}, f,
+                          separators=(',', ':'))
+
+        elif file_format == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError('the parquet format needs pyarrow (pip install pyarrow)') from None
+
+            pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), filename)
+
+        else:
+            raise ValueError(f'Unknown format \'{file_format}\' (expected one of {", ".join(FORMATS)})')
+
+        filenames.append(filename)
+
+    return filenames
+
+
+def render(tables: dict[str, list[dict]], challenge: Challenge, directory: str) -> list[str]:
+    """
+        - Draws the analysis of a solution as images (offline, with matplotlib): the Gantt chart of the drones, the
+          heatmap of the activity of the warehouses over time, and the map of the completion turn of the orders
+        :return:        The written files
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ImportError('the charts need matplotlib (pip install matplotlib)') from None
+
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+
+    # Gantt chart: one line per drone, flights in grey and actions colored by command
+    colors = {COMMANDS[LOAD]: 'tab:blue', COMMANDS[UNLOAD]: 'tab:purple', COMMANDS[DELIVER]: 'tab:green',
+              COMMANDS[WAIT]: 'tab:orange'}
+    figure, axis = plt.subplots(figsize=(14, max(3, len(challenge.drones) * 0.25)))
+
+    for drone in challenge.drones:
+        events = [e for e in tables['timeline'] if e['drone'] == drone.id]
+        axis.broken_barh([(e['start'], e['arrival'] - e['start']) for e in events], (drone.id - 0.4, 0.8),
+                         color='lightgrey')
+        for command, color in colors.items():
+            axis.broken_barh([(e['arrival'], e['end'] - e['arrival']) for e in events if e['command'] == command],
+                             (drone.id - 0.4, 0.8), color=color)
+
+    axis.axvline(challenge.deadline, color='red', linewidth=1)
+    axis.set_xlabel('Turn')
+    axis.set_ylabel('Drone')
+    axis.set_title('Drone timelines (grey: flying, blue: loading, green: delivering, orange: waiting)')
+    filenames.append(_save_figure(plt, figure, directory, 'gantt.png'))
+
+    # Heatmap: loads of each warehouse in each window of turns
+    windows = ceil(challenge.deadline / HOTSPOT_WINDOW)
+    heat = [[0] * windows for _ in challenge.warehouses]
+    for cell in tables['warehouse_activity']:
+        heat[cell['warehouse']][min(windows - 1, cell['window_start'] // HOTSPOT_WINDOW)] += cell['loads']
+
+    figure, axis = plt.subplots(figsize=(12, max(3, len(challenge.warehouses) * 0.3)))
+    image = axis.imshow(heat, aspect='auto', cmap='hot', interpolation='nearest',
+                        extent=(0, windows * HOTSPOT_WINDOW, len(challenge.warehouses) - 0.5, -0.5))
+    figure.colorbar(image, ax=axis, label='Loads')
+    axis.set_xlabel('Turn')
+    axis.set_ylabel('Warehouse')
+    axis.set_title('Warehouse hot spots')
+    filenames.append(_save_figure(plt, figure, directory, 'hotspots.png'))
+
+    # Map: orders colored by their completion turn, warehouses sized by their amount of loads
+    figure, axis = plt.subplots(figsize=(10, 8))
+    completed = [o for o in tables['orders'] if o['completion'] is not None]
+    unfinished = [o for o in tables['orders'] if o['completion'] is None]
+    points = axis.scatter([o['y'] for o in completed], [o['x'] for o in completed],
+                          c=[o['completion'] for o in completed], cmap='viridis', s=8)
+    axis.scatter([o['y'] for o in unfinished], [o['x'] for o in unfinished], color='red', marker='x', s=8)
+    axis.scatter([w['y'] for w in tables['hotspots']], [w['x'] for w in tables['hotspots']],
+                 s=[20 + w['loads'] for w in tables['hotspots']], color='black', marker='s', alpha=0.6)
+    figure.colorbar(points, ax=axis, label='Completion turn')
+    axis.invert_yaxis()
+    axis.set_title('Completion of the orders (red: unfinished), and warehouses (size: loads)')
+    filenames.append(_save_figure(plt, figure, directory, 'orders.png'))
+
+    return filenames
+
+
+def _save_figure(plt, figure, directory: str, name: str) -> str:
+    """
+        - Saves a figure and frees it
+        :return:        The written file
+    """
+    filename = os.path.join(directory, name)
+    figure.tight_layout()
+    figure.savefig(filename, dpi=120)
+    plt.close(figure)
+
+    return filename
+
+
+def main(arguments: list[str] = None) -> None:
+    """
+        Command line of the analysis (python main.py analyse ...)
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='main.py analyse', description='Analyse (and compare) solutions.')
+    parser.add_argument('challenge', type=str,
+                        help='challenge definition filename')
+    parser.add_argument('solution', type=str,
+                        help='solution filename (output file of main.py)')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='second solution of the same challenge, compared with the first one')
+    parser.add_argument('--output', type=str, default='analysis',
+                        help='directory of the exported tables and charts')
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help='format of the exported tables')
+    parser.add_argument('--plot', action='store_true',
+                        help='also render the charts (needs matplotlib)')
+    args = parser.parse_args(arguments)
+
+    challenge = parse_challenge(args.challenge)
+    tables = analyse(parse_solution(args.solution), challenge)
+    print(format_summary(tables))
+
+    try:
+        files = export_tables(tables, args.output, args.format)
+
+        if args.plot:
+            files += render(tables, challenge, args.output)
+
+        if args.compare is not None:
+            compared = analyse(parse_solution(args.compare), challenge)
+            diff = diff_solutions(tables, compared)
+            print()
+            print(format_summary(compared))
+            print()
+            print(format_diff(diff))
+            files += export_tables(diff, args.output, args.format)
+
+    except ImportError as error:
+        raise SystemExit(f'Missing dependency: {error}')
+
+    print(f'Files saved in {args.output} ({len(files)} files)')
@@ -0,0 +1,184 @@
+"""
+@title : Benchmark
+@description : Compares the algorithms on the challenges: score, time, and gap to the best possible score
+"""
+
+from parser import parse_challenge
+from evaluator import upper_bound, exact_solve, random_challenge
+from scoring import fast_score_solution
+from strategies import strategy_names, run_strategy
+from utils.Challenge import Challenge
+from copy import deepcopy
+import subprocess
+import tempfile
+import glob
+import os
+import sys
+import time
+
+# Algorithms compared by default
+STRATEGIES = strategy_names()
+
+# Directory of the command line interface (main.py) and of the challenges
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Maximum time for running the command line interface with the lightest algorithm on the smallest challenge (in
+# milliseconds, the start of the interpreter included)
+STARTUP_BUDGET_MS = 80
+STARTUP_STRATEGY = 'naive'
+STARTUP_CHALLENGE = os.path.join(ROOT, 'challenges', 'a_example.in')
+# Modules (and their submodules) which must not be imported by the command line interface to run this algorithm
+STARTUP_FORBIDDEN = ['numpy', 'numba', 'multiprocessing', 'concurrent', 'clustering', 'utils.KeyedHeap',
+                     'utils.DemandIndex', 'utils.SegmentCache', 'utils.SharedChallenge']
+
+# Challenges small enough for the exact solver (total amount of ordered items)
+EXACT_MAX_ITEMS = 8
+
+
+def gap(reference: int, score: int) -> str:
+    """
+        - Relative gap between a score and a reference score (optimum or bound)
+        :return:        The formatted gap
+    """
+    if reference is None or reference <= 0:
+        return '-'
+
+    return f'{(reference - score) / reference * 100:.2f}%'
+
+
+def benchmark_challenge(challenge: Challenge, strategies: list[str], exact_nodes: int) -> tuple[dict, list[dict]]:
+    """
+        - Runs every algorithm on the challenge, and compares them with the upper bound of the score, and with the
+          optimal score for the tiny challenges
+        :return:        The bounds of the challenge, and the result of each algorithm
+    """
+    bounds = {'upper_bound': upper_bound(challenge), 'optimum': None, 'proven': False}
+
+    items = sum(sum(order.products.values()) for order in challenge.orders)
+    if items <= EXACT_MAX_ITEMS:
+        _, bounds['optimum'], bounds['proven'] = exact_solve(challenge, exact_nodes)
+
+    results = []
+
+    for strategy in strategies:
+        start = time.perf_counter()
+
+        try:
+            solution = run_strategy(strategy, deepcopy(challenge))
+        except Exception as error:
+            results.append({'strategy': strategy, 'error': type(error).__name__})
+            continue
+
+        seconds = time.perf_counter() - start
+        results.append({'strategy': strategy, 'score': fast_score_solution(solution, challenge, 'auto'),
+                        'seconds': seconds})
+
+    return bounds, results
+
+
+def startup_time(strategy: str = STARTUP_STRATEGY, challenge: str = STARTUP_CHALLENGE,
+                 runs: int = 3) -> tuple[float, list[str]]:
+    """
+        - Measures the command line interface solving a challenge with an algorithm (python main.py challenge
+          output --strategy strategy), in a new interpreter each time, and lists the modules it imports
+          (python -X importtime)
+        :return:        The fastest of the runs (in milliseconds), and the modules imported by the last one
+    """
+    fastest = None
+    imported = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        command = [sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py'), challenge,
+                   os.path.join(directory, 'output'), '--strategy', strategy]
+
+        for _ in range(runs):
+            start = time.perf_counter()
+            process = subprocess.run(command, capture_output=True, text=True, check=True)
+            milliseconds = (time.perf_counter() - start) * 1000
+            fastest = milliseconds if fastest is None else min(fastest, milliseconds)
+
+    # Lines 'import time: self [us] | cumulative | imported package', the nesting being given by the indentation
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('imported package'):
+            imported.append(line.split('|')[2].strip())
+
+    return fastest, imported
+
+
+def check_startup(budget: float = STARTUP_BUDGET_MS) -> bool:
+    """
+        - Checks that the command line interface runs the lightest algorithm in its budget, without loading the
+          modules of the other algorithms nor the accelerators
+        :return:        True if the startup did not regress
+    """
+    milliseconds, imported = startup_time()
+    forbidden = sorted({name for name in imported
+                        if any(name == module or name.startswith(module + '.') for module in STARTUP_FORBIDDEN)})
+
+    print(f'Startup ({STARTUP_STRATEGY} on {os.path.basename(STARTUP_CHALLENGE)}) : {milliseconds:.1f} ms '
+          f'(budget {budget} ms)')
+    if forbidden:
+        print(f'Modules imported by {STARTUP_STRATEGY} : {", ".join(forbidden)}')
+
+    return milliseconds <= budget and not forbidden
+
+
+def format_results(name: str, bounds: dict, results: list[dict]) -> str:
+    """
+        - Formats the results of a challenge as a markdown table
+        :return:        The table
+    """
+    optimum = bounds['optimum'] if bounds['proven'] else None
+
+    lines = [
+        f'#### {name}',
+        '',
+        f'Upper bound : {bounds["upper_bound"]}' + (
+            f' / Optimum : {bounds["optimum"]}' if bounds['proven'] else
+            f' / Best exact search : {bounds["optimum"]} (not proven)' if bounds['optimum'] is not None else ''
+        ),
+        '',
+        '| Strategy | Score | Time (s) | Gap to optimum | Gap to bound |',
+        '|----------|-------|----------|----------------|--------------|',
+    ]
+
+    for result in results:
+        if 'error' in result:
+            lines.append(f'| {result["strategy"]} | {result["error"]} | - | - | - |')
+            continue
+
+        lines.append(
+            f'| {result["strategy"]} | {result["score"]} | {result["seconds"]:.2f} '
+            f'| {gap(optimum, result["score"])} | {gap(bounds["upper_bound"], result["score"])} |'
+        )
+
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare the algorithms on the challenges.')
+    parser.add_argument('challenges', type=str, nargs='*', default=None,
+                        help='challenge definition filenames (all the challenges by default)')
+    parser.add_argument('--strategies', type=str, default=','.join(STRATEGIES),
+                        help='comma separated list of the algorithms to compare')
+    parser.add_argument('--generated', type=int, default=0,
+                        help='amount of generated tiny challenges to add (solved exactly)')
+    parser.add_argument('--exact-nodes', type=int, default=1000000,
+                        help='maximum amount of nodes explored by the exact solver')
+    parser.add_argument('--startup', action='store_true',
+                        help='only check the startup time of the command line interface (exits with 1 if it regressed)')
+    args = parser.parse_args()
+
+    if args.startup:
+        raise SystemExit(0 if check_startup() else 1)
+
+    challenges = [(filename, parse_challenge(filename))
+                  for filename in (args.challenges or sorted(glob.glob('challenges/*.in')))]
+    challenges += [(f'generated_{seed}', random_challenge(seed)) for seed in range(args.generated)]
+
+    for name, challenge in challenges:
+        bounds, results = benchmark_challenge(challenge, args.strategies.split(','), args.exact_nodes)
+        print(format_results(name, bounds, results))
+        print()
@@ -0,0 +1,251 @@
+"""
+@title : Clustering
+@description : Groups the orders of a challenge into geographical zones, weighted by the demand of each order
+"""
+
+from utils.Challenge import Challenge
+from utils.Order import Order
+from utils.accel import get_numpy
+from math import ceil
+import random
+
+# Maximum amount of zones tried when the amount of zones is chosen automatically
+MAX_ZONES = 8
+# Minimal relative gain of inertia for a new zone to be worth it (elbow method)
+MIN_ZONE_GAIN = 0.3
+# Maximum amount of iterations of the k-means algorithm
+MAX_ITERATIONS = 100
+
+
+def order_weight(order: Order, product_weights: list[int]) -> int:
+    """
+        - Calculates the total weight of the products still needed by an order
+        :return:        The weight of the order
+    """
+    return sum(product_weights[product] * quantity for product, quantity in order.products.items())
+
+
+def squared_distance(location1: tuple[float, float], location2: tuple[float, float]) -> float:
+    """
+        - Calculates the squared euclidean distance between two points (no need for the square root to compare them)
+        :return:        The squared distance
+    """
+    return (location1[0] - location2[0]) ** 2 + (location1[1] - location2[1]) ** 2
+
+
+def initial_centers(points: list[tuple[int, int]], weights: list[int], k: int,
+                    rng: random.Random) -> list[tuple[float, float]]:
+    """
+        - Chooses the first centers of the k-means algorithm (weighted k-means++ seeding)
+        - Every new center is picked with a probability proportional to its weight times its squared distance
+          from the closest center already chosen
+        :return:        The list of the k initial centers
+    """
+    centers = [points[rng.choices(range(len(points)), weights=weights)[0]]]
+
+    # Squared distance between each point and its closest center
+    closest = [squared_distance(point, centers[0]) for point in points]
+
+    while len(centers) < k:
+        probabilities = [weight * distance for weight, distance in zip(weights, closest)]
+
+        # Every point is already on a center, so any point will do
+        if sum(probabilities) == 0:
+            probabilities = weights
+
+        center = points[rng.choices(range(len(points)), weights=probabilities)[0]]
+        centers.append(center)
+
+        closest = [min(distance, squared_distance(point, center)) for point, distance in zip(points, closest)]
+
+    return centers
+
+
+def _kmeans_python(points: list[tuple[int, int]], weights: list[int],
+                   centers: list[tuple[float, float]]) -> tuple[list[int], float]:
+    """
+        - Pure Python implementation of the weighted k-means iterations
+        :return:        The zone of each point, and the weighted inertia of the clustering
+    """
+    labels = []
+
+    for _ in range(MAX_ITERATIONS):
+        # Assigning each point to its closest center
+        new_labels = [
+            min(range(len(centers)), key=lambda c: squared_distance(point, centers[c])) for point in points
+        ]
+
+        # The algorithm has converged
+        if new_labels == labels:
+            break
+
+        labels = new_labels
+
+        # Moving every center to the weighted mean of its points
+        sums = [[0, 0, 0] for _ in centers]
+        for point, weight, label in zip(points, weights, labels):
+            sums[label][0] += weight * point[0]
+            sums[label][1] += weight * point[1]
+            sums[label][2] += weight
+
+        # An empty zone keeps its previous center
+        centers = [(s[0] / s[2], s[1] / s[2]) if s[2] > 0 else center for s, center in zip(sums, centers)]
+
+    inertia = sum(weight * squared_distance(point, centers[label])
+                  for point, weight, label in zip(points, weights, labels))
+
+    return labels, inertia
+
+
+def _kmeans_numpy(np, points: list[tuple[int, int]], weights: list[int],
+                  centers: list[tuple[float, float]]) -> tuple[list[int], float]:
+    """
+        - Vectorized implementation of the weighted k-means iterations
+        :return:        The zone of each point, and the weighted inertia of the clustering
+    """
+    coordinates = np.asarray(points, dtype=np.float64)
+    masses = np.asarray(weights, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    k = len(centers)
+
+    labels = None
+
+    for _ in range(MAX_ITERATIONS):
+        # Squared distances between every point and every center, shape (points, centers)
+        distances = ((coordinates[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+
+        # The algorithm has converged
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+
+        labels = new_labels
+
+        # Moving every center to the weighted mean of its points
+        total = np.bincount(labels, weights=masses, minlength=k)
+        rows = np.bincount(labels, weights=masses * coordinates[:, 0], minlength=k)
+        columns = np.bincount(labels, weights=masses * coordinates[:, 1], minlength=k)
+
+        # An empty zone keeps its previous center
+        filled = total > 0
+        centers[filled, 0] = rows[filled] / total[filled]
+        centers[filled, 1] = columns[filled] / total[filled]
+
+    inertia = float((masses * ((coordinates - centers[labels]) ** 2).sum(axis=1)).sum())
+
+    return labels.tolist(), inertia
+
+
+def kmeans(points: list[tuple[int, int]], weights: list[int], k: int, seed: int = 0) -> tuple[list[int], float]:
+    """
+        - Weighted k-means clustering of the given points
+        - Uses NumPy when it is installed, and a pure Python implementation otherwise
+        :return:        The zone of each point, and the weighted inertia of the clustering
+    """
+    centers = initial_centers(points, weights, k, random.Random(seed))
+
+    np = get_numpy()
+
+    if np is not None:
+        return _kmeans_numpy(np, points, weights, centers)
+
+    return _kmeans_python(points, weights, centers)
+
+
+def cluster_orders(challenge: Challenge, nb_zones: int = None, seed: int = 0) -> list[list[Order]]:
+    """
+        - Splits the orders of the challenge into zones of close orders, the heaviest orders pulling the centers
+        - If no amount of zones is given, it is chosen with the elbow method: a new zone is added only while it
+          lowers the inertia by at least MIN_ZONE_GAIN, and while every zone can still keep all the drones busy
+        :return:        The list of the orders of each zone (no empty zone)
+    """
+    orders = challenge.orders
+
+    if len(orders) == 0:
+        return []
+
+    points = [order.location for order in orders]
+    # Every order weights at least 1, so empty orders are still clustered
+    weights = [max(1, order_weight(order, challenge.product_weights)) for order in orders]
+
+    if nb_zones is not None:
+        labels, _ = kmeans(points, weights, min(nb_zones, len(orders)), seed)
+    else:
+        labels, inertia = kmeans(points, weights, 1, seed)
+
+        # A zone with fewer orders than drones would leave some drones idle
+        max_zones = min(MAX_ZONES, len(orders) // max(1, len(challenge.drones)))
+
+        for k in range(2, max_zones + 1):
+            new_labels, new_inertia = kmeans(points, weights, k, seed)
+
+            # Stop adding zones when the gain is not worth it anymore
+            if new_inertia > (1 - MIN_ZONE_GAIN) * inertia:
+                break
+
+            labels, inertia = new_labels, new_inertia
+
+    zones = {}
+    for order, label in zip(orders, labels):
+        zones.setdefault(label, []).append(order)
+
+    return list(zones.values())
+
+
+def estimate_order_turns(challenge: Challenge, order: Order) -> int:
+    """
+        - Rough estimation of the turns needed to deliver an order: round trips from the closest warehouse,
+          with one load and one delivery per product type on each trip
+        :return:        The estimated amount of turns
+    """
+    distance = min(Challenge.calculate_distance(w.location, order.location) for w in challenge.warehouses)
+    trips = max(1, ceil(order_weight(order, challenge.product_weights) / challenge.max_payload))
+    product_types = len([p for p, q in order.products.items() if q > 0])
+
+    return trips * 2 * (distance + product_types)
+
+
+def estimate_zone_score(challenge: Challenge, zone: list[Order]) -> float:
+    """
+        - Estimates the score per turn of a zone: the amount of orders it completes for each estimated turn.
+          Zones with the best ratio should be delivered first (shortest processing time first)
+        :return:        The estimated amount of completed orders per turn
+    """
+    turns = sum(estimate_order_turns(challenge, order) for order in zone)
+
+    return len(zone) / turns if turns > 0 else float(len(zone))
+
+
+def reserve_stock(challenge: Challenge, zones: list[list[Order]]) -> list[list[list[int]]]:
+    """
+        - Shares the stock of the warehouses among the zones, in the given order of the zones.
+          Each order takes its products from the closest warehouses, as the algorithms would do,
+          so the zones can then be solved independently without sharing any stock
+        :return:        For each zone, the stock reserved in each warehouse (zone -> warehouse -> product)
+    """
+    stock = [list(warehouse.products) for warehouse in challenge.warehouses]
+    reservations = []
+
+    for zone in zones:
+        reserved = [[0] * len(challenge.product_weights) for _ in challenge.warehouses]
+
+        for order in zone:
+            # Same warehouse priority as the algorithms (closest from the order first)
+            warehouses = sorted(
+                challenge.warehouses,
+                key=lambda w: Challenge.calculate_distance(w.location, order.location)
+            )
+
+            for product, quantity in order.products.items():
+                for warehouse in warehouses:
+                    if quantity == 0:
+                        break
+
+                    take = min(quantity, stock[warehouse.id][product])
+                    stock[warehouse.id][product] -= take
+                    reserved[warehouse.id][product] += take
+                    quantity -= take
+
+        reservations.append(reserved)
+
+    return reservations
@@ -0,0 +1,335 @@
+"""
+@title : Evaluator
+@description : Bounds on the best possible score of a challenge, and exact solver for tiny challenges
+"""
+
+from utils.Challenge import Challenge
+from utils.Warehouse import Warehouse
+from utils.Order import Order
+from utils.ActionBuffer import ActionBuffer, LOAD, DELIVER
+from utils.accel import get_numpy
+from math import ceil
+import random
+
+# Order of the moves for the symmetry breaking of the exact solver (a drone stopping is the last move)
+MOVE_LOAD = 0
+MOVE_DELIVER = 1
+MOVE_STOP = 2
+
+
+def order_points(challenge: Challenge, turn: int) -> int:
+    """
+        - Points given by an order completed at the given turn (nothing if it is after the deadline)
+        :return:        The points of the order
+    """
+    if turn > challenge.deadline:
+        return 0
+
+    return ceil(((challenge.deadline - turn) / challenge.deadline) * 100)
+
+
+def order_turn_lower_bounds(challenge: Challenge) -> list[int | None]:
+    """
+        - Relaxation giving, for every order, the earliest turn it can be completed at: every product of the order
+          is brought by its own drone (perfect drone split), which flies from the first warehouse to the best
+          warehouse having the product in stock, loads it, then flies to the order (no stock shared between orders)
+        - Vectorized with NumPy when it is installed
+        :return:        The lower bound of the completion turn of each order (None if it can not be completed)
+    """
+    np = get_numpy()
+
+    if np is None:
+        return _order_turn_lower_bounds_python(challenge)
+
+    start = np.array(challenge.warehouses[0].location, dtype=np.int64)
+    warehouses = np.array([w.location for w in challenge.warehouses], dtype=np.int64)
+    orders = np.array([o.location for o in challenge.orders], dtype=np.int64).reshape(-1, 2)
+    stock = np.array([w.products for w in challenge.warehouses], dtype=np.int64)
+
+    # Turns to load at each warehouse (from the start), then to fly from each warehouse to each order
+    to_warehouse = np.ceil(np.sqrt(((warehouses - start) ** 2).sum(axis=1))).astype(np.int64) + 1
+    to_order = np.ceil(np.sqrt(((warehouses[:, None, :] - orders[None, :, :]) ** 2).sum(axis=2))).astype(np.int64)
+    turns = to_warehouse[:, None] + to_order
+
+    # Every (order, product) still needed
+    pairs = [(i, product) for i, order in enumerate(challenge.orders)
+             for product, quantity in order.products.items() if quantity > 0]
+    bounds = np.zeros(len(challenge.orders), dtype=np.int64)
+
+    if len(pairs) == 0:
+        return [int(bound) for bound in bounds]
+
+    pair_orders, pair_products = np.array(pairs, dtype=np.int64).T
+
+    # Best warehouse having the product for each pair, shape (warehouses, pairs)
+    candidates = np.where(stock[:, pair_products] > 0, turns[:, pair_orders], np.iinfo(np.int64).max)
+    pair_turns = candidates.min(axis=0)
+
+    np.maximum.at(bounds, pair_orders, pair_turns)
+
+    return [None if bound == np.iinfo(np.int64).max else int(bound) for bound in bounds]
+
+
+def _order_turn_lower_bounds_python(challenge: Challenge) -> list[int | None]:
+    """
+        - Pure Python version of order_turn_lower_bounds
+        :return:        The lower bound of the completion turn of each order (None if it can not be completed)
+    """
+    start = challenge.warehouses[0].location
+    bounds = []
+
+    for order in challenge.orders:
+        bound = 0
+
+        for product, quantity in order.products.items():
+            if quantity == 0:
+                continue
+
+            turns = [
+                Challenge.calculate_distance(start, w.location) + 1 +
+                Challenge.calculate_distance(w.location, order.location)
+                for w in challenge.warehouses if w.products[product] > 0
+            ]
+
+            # Nobody has this product
+            if len(turns) == 0:
+                bound = None
+                break
+
+            bound = max(bound, min(turns))
+
+        bounds.append(bound)
+
+    return bounds
+
+
+def upper_bound(challenge: Challenge) -> int:
+    """
+        - Upper bound of the score: every order completed at its earliest possible turn (see order_turn_lower_bounds)
+        :return:        The upper bound of the score
+    """
+    return sum(order_points(challenge, turn) for turn in order_turn_lower_bounds(challenge) if turn is not None)
+
+
+def exact_solve(challenge: Challenge, max_nodes: int = 1000000) -> tuple[ActionBuffer, int, bool]:
+    """
+        Branch and bound search of the best solution, only usable on tiny challenges.
+        The drones are simulated event by event: the drone which is available the earliest chooses its next action
+        (loading some units of a useful product, delivering one of the products it carries to an order needing
+        it, as many units as the order still needs, or stopping for good). Waiting is never useful, as the stock
+        only decreases. Drones which have not moved yet are used in order, to skip the permutations of the drones.
+        The stock is committed when a load is decided (by the drone available the earliest), not at the turn the
+        drone arrives at the warehouse, so a drone deciding later but arriving sooner can not take the units
+        already given to another one. The search never unloads, so a set of loads is possible as soon as it does
+        not take more than the stock, whatever their order: the optimum is proven under this assumption (no
+        unloading, no waiting), not among every possible solution.
+        A branch is cut when its score plus the best possible score of the remaining orders (each one delivered
+        by the closest available drone) can not beat the best solution found.
+        :return:        The best solution found, its score, and True if it is proven optimal among the solutions
+                        described above (False if the search stopped after max_nodes nodes)
+    """
+    deadline = challenge.deadline
+    weights = challenge.product_weights
+    warehouses = challenge.warehouses
+    orders = challenge.orders
+    drone_count = len(challenge.drones)
+    start = warehouses[0].location
+
+    distance = Challenge.calculate_distance
+
+    best = {'score': -1, 'actions': None}
+    nodes = [0]
+
+    def remaining_bound(state: dict) -> int:
+        """
+            - Best possible points of the orders which are not completed yet
+        """
+        total = 0
+        active = [d for d in range(drone_count) if state['active'][d]]
+
+        for o, order in enumerate(orders):
+            if state['completed'][o]:
+                continue
+            if len(active) == 0:
+                continue
+
+            turn = min(state['time'][d] + distance(state['pos'][d], order.location) for d in active)
+            turn = max(turn, state['turn'][o])
+            total += order_points(challenge, turn)
+
+        return total
+
+    def moves(state: dict, d: int) -> list[tuple]:
+        """
+            - Every possible next action of the drone d
+        """
+        result = []
+        pos, time, load = state['pos'][d], state['time'][d], state['load'][d]
+        weight = sum(weights[p] * q for p, q in load.items())
+
+        # Deliveries (everything the order needs among what the drone carries)
+        for o, order in enumerate(orders):
+            arrival = time + distance(pos, order.location)
+            if arrival + 1 > deadline:
+                continue
+            for p, q in load.items():
+                need = state['need'][o].get(p, 0)
+                if q > 0 and need > 0:
+                    result.append((MOVE_DELIVER, o, p, min(q, need)))
+
+        # Products still needed which are not carried by any drone yet
+        outstanding = {}
+        for o in range(len(orders)):
+            for p, q in state['need'][o].items():
+                outstanding[p] = outstanding.get(p, 0) + q
+        for other in range(drone_count):
+            for p, q in state['load'][other].items():
+                outstanding[p] = outstanding.get(p, 0) - q
+
+        # Loads
+        for w, warehouse in enumerate(warehouses):
+            if time + distance(pos, warehouse.location) + 1 > deadline:
+                continue
+            for p, q in outstanding.items():
+                most = min(q, state['stock'][w][p], (challenge.max_payload - weight) // weights[p])
+                for quantity in range(most, 0, -1):
+                    result.append((MOVE_LOAD, w, p, quantity))
+
+        result.append((MOVE_STOP, 0, 0, 0))
+
+        return result
+
+    def play(state: dict, d: int, move: tuple) -> dict:
+        """
+            - Applies a move of the drone d on a copy of the state
+        """
+        kind, target, p, q = move
+        state = {
+            'pos': list(state['pos']), 'time': list(state['time']), 'active': list(state['active']),
+            'load': [dict(load) for load in state['load']], 'stock': state['stock'], 'need': state['need'],
+            'turn': state['turn'], 'completed': state['completed'], 'score': state['score'],
+            'first': list(state['first']), 'actions': state['actions'],
+        }
+
+        if state['first'][d] is None:
+            state['first'][d] = move
+
+        if kind == MOVE_STOP:
+            state['active'][d] = False
+            return state
+
+        if kind == MOVE_LOAD:
+            location = warehouses[target].location
+            state['time'][d] += distance(state['pos'][d], location) + 1
+            state['stock'] = [list(s) for s in state['stock']]
+            state['stock'][target][p] -= q
+            state['load'][d][p] = state['load'][d].get(p, 0) + q
+            state['actions'] = state['actions'] + [(d, LOAD, warehouses[target].id, p, q)]
+
+        else:
+            location = orders[target].location
+            arrival = state['time'][d] + distance(state['pos'][d], location)
+            state['time'][d] = arrival + 1
+            state['need'] = [dict(n) for n in state['need']]
+            state['need'][target][p] -= q
+            state['load'][d][p] -= q
+            state['turn'] = list(state['turn'])
+            state['turn'][target] = max(state['turn'][target], arrival)
+            state['actions'] = state['actions'] + [(d, DELIVER, orders[target].id, p, q)]
+
+            if all(n == 0 for n in state['need'][target].values()):
+                state['completed'] = list(state['completed'])
+                state['completed'][target] = True
+                state['score'] += order_points(challenge, state['turn'][target])
+
+        state['pos'][d] = location
+
+        return state
+
+    def search(state: dict) -> None:
+        nodes[0] += 1
+
+        if state['score'] > best['score']:
+            best['score'] = state['score']
+            best['actions'] = state['actions']
+
+        if nodes[0] >= max_nodes:
+            return
+
+        active = [d for d in range(drone_count) if state['active'][d]]
+        if len(active) == 0 or all(state['completed']):
+            return
+
+        # Cutting the branch if it can not beat the best solution
+        if state['score'] + remaining_bound(state) <= best['score']:
+            return
+
+        # The drone available the earliest plays
+        d = min(active, key=lambda i: (state['time'][i], i))
+
+        for move in moves(state, d):
+            # Symmetry breaking: a drone which has not moved yet can not start before the previous one
+            if state['first'][d] is None and d > 0 and state['first'][d - 1] is not None \
+                    and move < state['first'][d - 1]:
+                continue
+
+            search(play(state, d, move))
+
+            if nodes[0] >= max_nodes:
+                return
+
+    search({
+        'pos': [start] * drone_count,
+        'time': [0] * drone_count,
+        'active': [True] * drone_count,
+        'load': [{} for _ in range(drone_count)],
+        'stock': [list(w.products) for w in warehouses],
+        'need': [dict(o.products) for o in orders],
+        'turn': [0] * len(orders),
+        'completed': [all(q == 0 for q in o.products.values()) for o in orders],
+        'score': 0,
+        'first': [None] * drone_count,
+        'actions': [],
+    })
+
+    solution = ActionBuffer()
+    for action in best['actions'] or []:
+        solution.add(*action)
+
+    # Keeping the actions of each drone together
+    solution = ActionBuffer(sorted(solution, key=lambda a: a[0]))
+
+    return solution, best['score'], nodes[0] < max_nodes
+
+
+def random_challenge(seed: int, rows: int = 20, columns: int = 20, drones: int = 2, deadline: int = 60,
+                     max_payload: int = 20, products: int = 3, warehouses: int = 2, orders: int = 3,
+                     max_items: int = 2) -> Challenge:
+    """
+        - Generates a small random challenge, which always has enough stock for every order
+        :return:        The generated challenge
+    """
+    rng = random.Random(seed)
+
+    def location() -> tuple[int, int]:
+        return rng.randrange(rows), rng.randrange(columns)
+
+    product_weights = [rng.randint(1, max_payload) for _ in range(products)]
+
+    order_list = [
+        Order(i, location(), [rng.randrange(products) for _ in range(rng.randint(1, max_items))])
+        for i in range(orders)
+    ]
+
+    # Spreading the needed products among the warehouses, plus some extra stock
+    stock = [[0] * products for _ in range(warehouses)]
+    for order in order_list:
+        for product, quantity in order.products.items():
+            for _ in range(quantity):
+                stock[rng.randrange(warehouses)][product] += 1
+    for _ in range(products):
+        stock[rng.randrange(warehouses)][rng.randrange(products)] += 1
+
+    warehouse_list = [Warehouse(i, location(), stock[i]) for i in range(warehouses)]
+
+    return Challenge(rows, columns, drones, deadline, max_payload, product_weights, warehouse_list, order_list)
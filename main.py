@@ -4,10 +4,32 @@
 """
 
 from parser import parse_challenge
-from solver import solve, score_solution, save_solution
+from strategies import strategy_names, run_strategy, is_configurable, has_stream, stream_strategy
+from utils.SolverConfig import SolverConfig, DEFAULT_CONFIG
 from copy import deepcopy
+import sys
 
-if __name__ == "__main__":
+# The solver, the scoring and the accelerators (NumPy, Numba) are only imported by the modes which use them
+
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == 'tune':
+
+    # Tuning the constants of the algorithms (python main.py tune challenges/*.in)
+    import tuner
+    tuner.main(sys.argv[2:])
+
+elif __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == 'serve':
+
+    # Local solving server, keeping the parsed challenges between the requests (python main.py serve --port 8000)
+    import server
+    server.main(sys.argv[2:])
+
+elif __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == 'analyse':
+
+    # Exporting the timelines of a solution, and comparing it with another one (python main.py analyse ...)
+    import analysis
+    analysis.main(sys.argv[2:])
+
+elif __name__ == "__main__":
 
     # Fetching the argument of the runned command (taking the files to solve as an input)
     import argparse
@@ -18,18 +40,86 @@ if __name__ == "__main__":
     parser.add_argument('output', type=str, default=None,
                         help='output filename',
                         metavar="output.txt")
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help='anytime mode: stop searching after this amount of seconds')
+    parser.add_argument('--checkpoint-every', type=float, default=None,
+                        help='anytime mode: write the best solution at most once every this amount of seconds')
+    parser.add_argument('--strategy', choices=strategy_names(), default=None,
+                        help='run only the given algorithm (instead of comparing the algorithms)')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='profile file created by "main.py tune", giving the constants to use for this challenge')
+    parser.add_argument('--backend', choices=['python', 'numpy', 'numba', 'auto'], default=None,
+                        help='scoring backend used by the algorithms (the accelerated ones load NumPy / Numba)')
     args = parser.parse_args()
 
+    # A single algorithm runs without time limit nor checkpoints, only the anytime mode has them
+    if args.strategy is not None and (args.time_limit is not None or args.checkpoint_every is not None):
+        parser.error('--strategy can not be combined with the anytime mode (--time-limit, --checkpoint-every)')
+
     # Parsing a given file into a Challenge object
     challenge = parse_challenge(args.challenge)
 
     saved_challenge = deepcopy(challenge)
-    
-    # Calculating an optimized solution for the given file
-    solution = solve(challenge)
+
+    # Constants of the algorithms, tuned for this challenge if a profile is given
+    config = SolverConfig.load_profile(args.profile, args.challenge) if args.profile is not None else DEFAULT_CONFIG
+
+    anytime = args.time_limit is not None or args.checkpoint_every is not None
+    strategy = args.strategy
+    tuned_strategy = None
+
+    if args.profile is not None:
+        # Without any algorithm nor the anytime mode, the algorithm the profile was tuned for is compared with the
+        # default one (see solve), so a profile never makes the default run worse
+        tuned_strategy = SolverConfig.load_profile_strategy(args.profile, args.challenge)
+
+        # Only the anytime mode and the algorithms taking the config use the constants of the profile
+        if not (is_configurable(strategy) if strategy is not None else (anytime or tuned_strategy is not None)):
+            print("Warning: the profile is not used by this mode (use --strategy workload_repartition or layers, "
+                  "or the anytime mode)", file=sys.stderr)
+        elif strategy is not None and tuned_strategy is not None and strategy != tuned_strategy:
+            print(f"Warning: the profile was tuned for {tuned_strategy}, not for {strategy}", file=sys.stderr)
+
+    if args.backend is not None:
+        from scoring import set_default_backend
+        set_default_backend(args.backend)
+
+    from solver import solve, anytime_solve, save_solution, stream_solution
+    from scoring import score_solution
+
+    # Score already computed while the solution was written (streaming algorithms)
+    score = None
+
+    if strategy is not None and has_stream(strategy):
+        # Running only the requested algorithm, its actions being written and scored as soon as they are produced
+        # (the solution is never stored as a whole)
+        solution = None
+        score = stream_solution(args.output, stream_strategy(strategy, challenge, config), saved_challenge)
+
+    elif strategy is not None:
+        # Running only the requested algorithm
+        solution = run_strategy(strategy, challenge, config)
+
+    elif anytime:
+        # Anytime mode: the best solution so far is saved during the search
+        solution = anytime_solve(challenge, args.output, args.time_limit, args.checkpoint_every or 0,
+                                 config)
+
+        if solution is None:
+            print("Stopped before the first solution")
+            raise SystemExit(1)
+
+    else:
+        # Calculating an optimized solution for the given file (also trying the algorithm of the profile, if any)
+        solution = solve(challenge, config, tuned_strategy)
 
     if args.output is not None:
-        # Saving the solution in a file
-        save_solution(args.output, solution)
+        # Saving the solution in a file (already saved by the anytime mode and by the streaming algorithms)
+        if solution is not None and not anytime:
+            save_solution(args.output, solution)
         print(f"Solution saved in {args.output}")
-    print(f"Score: {score_solution(solution, saved_challenge)}")
+
+    if score is None:
+        score = score_solution(solution, saved_challenge)
+
+    print(f"Score: {score}")
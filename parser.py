@@ -1,11 +1,14 @@
 """
 @title : Parser
-@description : Parses a given input file into a Challenge object
+@description : Parses a given input file into a Challenge object, and an output file into its actions
 """
 
 from utils.Warehouse import Warehouse
 from utils.Order import Order
 from utils.Challenge import Challenge
+from utils.ActionBuffer import ActionBuffer, OPCODES, WAIT
+from typing import TextIO
+import io
 
 
 def parse_challenge(filename: str) -> Challenge:
@@ -15,31 +18,69 @@ def parse_challenge(filename: str) -> Challenge:
     """
 
     with open(filename, 'r') as f:
-        rows, columns, drone_count, deadline, max_load = [int(v) for v in f.readline().split()]
+        return read_challenge(f)
+
+
+def parse_challenge_text(text: str) -> Challenge:
+    """
+        - Generates a Challenge object from the content of an input file (sent to the server for example)
+        :return:        A Challenge object fed with the information from the text
+    """
+    return read_challenge(io.StringIO(text))
 
-        # Useless number of products
-        f.readline()
 
-        product_weights = [int(weight) for weight in f.readline().split()]
+def read_challenge(f: TextIO) -> Challenge:
+    """
+        - Reads a challenge from an opened input file
+        :return:        A Challenge object fed with the information from the file
+    """
+    rows, columns, drone_count, deadline, max_load = [int(v) for v in f.readline().split()]
+
+    # Useless number of products
+    f.readline()
 
-        warehouse_count = int(f.readline())
-        warehouse_list = []
+    product_weights = [int(weight) for weight in f.readline().split()]
 
-        # Generates the warehouses
-        for warehouse_id in range(warehouse_count):
-            x, y = [int(v) for v in f.readline().split()]
-            warehouse_products = [int(v) for v in f.readline().split()]
-            warehouse_list.append(Warehouse(warehouse_id, (x, y), warehouse_products))
+    warehouse_count = int(f.readline())
+    warehouse_list = []
 
-        order_count = int(f.readline())
-        order_list = []
+    # Generates the warehouses
+    for warehouse_id in range(warehouse_count):
+        x, y = [int(v) for v in f.readline().split()]
+        warehouse_products = [int(v) for v in f.readline().split()]
+        warehouse_list.append(Warehouse(warehouse_id, (x, y), warehouse_products))
 
-        # Generates the orders
-        for order_id in range(order_count):
-            x, y = [int(v) for v in f.readline().split()]
-            # Useless count of products in order
-            f.readline()
-            order_product = [int(v) for v in f.readline().split()]
-            order_list.append(Order(order_id, (x, y), order_product))
+    order_count = int(f.readline())
+    order_list = []
+
+    # Generates the orders
+    for order_id in range(order_count):
+        x, y = [int(v) for v in f.readline().split()]
+        # Useless count of products in order
+        f.readline()
+        order_product = [int(v) for v in f.readline().split()]
+        order_list.append(Order(order_id, (x, y), order_product))
 
     return Challenge(rows, columns, drone_count, deadline, max_load, product_weights, warehouse_list, order_list)
+
+
+def parse_solution(filename: str) -> ActionBuffer:
+    """
+        - Reads an output file (the amount of actions, then one action per line)
+        :return:        The actions of the solution
+    """
+    solution = ActionBuffer()
+
+    with open(filename, 'r') as f:
+        count = int(f.readline())
+
+        for _ in range(count):
+            fields = f.readline().split()
+            opcode = OPCODES[fields[1]]
+
+            if opcode == WAIT:
+                solution.add(int(fields[0]), WAIT, int(fields[2]))
+            else:
+                solution.add(int(fields[0]), opcode, *(int(v) for v in fields[2:5]))
+
+    return solution
@@ -0,0 +1,556 @@
+"""
+@title : Scoring
+@description : Calculates the score of a solution, with the reference simulator or with accelerated kernels
+"""
+
+from utils.Challenge import Challenge
+from utils.ActionBuffer import ActionBuffer, LOAD, UNLOAD, DELIVER, WAIT, FIELDS
+from utils.types import Action
+from utils.accel import get_numpy, get_numba
+from math import sqrt, ceil
+from copy import deepcopy
+from array import array
+
+# Scoring kernel compiled by Numba, the first time it is used
+_jit_kernel = None
+
+# Backends of fast_score_solution ('auto' being the fastest installed one)
+BACKENDS = ['python', 'numpy', 'numba', 'auto']
+
+# Flags of the state of an order in StreamScorer (every product delivered once, product it has not asked for)
+ORDER_COMPLETED = 1
+ORDER_BROKEN = 2
+
+# Backend used when none is given: the reference simulator, so NumPy and Numba are only loaded when requested
+default_backend = 'python'
+
+
+def set_default_backend(backend: str) -> None:
+    """
+        - Chooses the backend used by fast_score_solution when none is given
+    """
+    global default_backend
+
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown scoring backend \'{backend}\'')
+
+    default_backend = backend
+
+
+def score_solution(solution: ActionBuffer | list[Action], challenge: Challenge) -> int:
+    """
+        Calculates the score for a given solution
+        :return:        The score of the solution
+    """
+    score = 0
+
+    # Packing the solution if needed, so the actions of each drone can be read directly
+    if not isinstance(solution, ActionBuffer):
+        solution = ActionBuffer(solution)
+
+    orders = {order.id: order for order in challenge.orders}
+    warehouses = {warehouse.id: warehouse for warehouse in challenge.warehouses}
+
+    # Saves the completed orders, so they don't count if there is a delivery afterward
+    completed_orders = set()
+
+    # Saves the turns where there have been a delivery at a specific order
+    order_turns = {}
+
+    for drone in challenge.drones:
+        turns = 0
+
+        # Initial position
+        pos = challenge.warehouses[0].location
+
+        # For every action of the given drone
+        for _, opcode, target, product, quantity in solution.for_drone(drone.id).rows():
+            # If the action is on a warehouse
+            if opcode == LOAD or opcode == UNLOAD:
+                # If the next location is a warehouse
+                next_pos = warehouses[target].location
+                # Distance flown plus 1 turn for the action itself
+                turns += Challenge.calculate_distance(pos, next_pos) + 1
+
+            # If the action is on an order
+            elif opcode == DELIVER:
+                # If the action is on an order
+                next_pos = orders[target].location
+                # Distance flown
+                turns += Challenge.calculate_distance(pos, next_pos)
+
+                # Insert the delivery action in the delivery turns
+                if target not in completed_orders:
+                    if target not in order_turns.keys():
+                        order_turns[target] = [turns]
+                    else:
+                        order_turns[target].append(turns)
+
+                # Removing the given products from the order list
+                orders[target].receive(product, quantity)
+
+                # Adding the delivery turn
+                turns += 1
+
+                # If every product has been delivered
+                if target not in completed_orders and orders[target].is_completed():
+                    completed_orders.add(target)
+
+            # If the action is just waiting
+            elif opcode == WAIT:
+                turns += target
+                continue
+
+            # If there is a problem with the given action
+            else:
+                continue
+
+            # Updating the new drone location
+            pos = next_pos
+
+    # Calculating the score for each completed order
+    for order, turns in order_turns.items():
+        if orders[order].is_completed():
+            score += ceil(((challenge.deadline - max(turns)) / challenge.deadline) * 100)
+
+    return score
+
+
+class StreamScorer:
+    """
+        Scores a solution action by action, in the order the actions are produced (see solver.stream_solution), so
+        the solution does not have to be stored to be scored. It keeps the turn and the location of every drone,
+        and, like score_solution, it empties the orders of the given challenge. It gives the same score as
+        score_solution, the actions of the drones being possibly mixed in the stream: only a delivery of 0 units
+        after the completion of an order could count here and not in score_solution, which plays the drones one
+        after the other.
+        The actions of unknown drones are ignored, and an order receiving a product it has not asked for is never
+        completed. The state of the orders is stored in flat arrays, indexed by the row of the order in the
+        challenge.
+
+        Class is defined by:
+            - deadline
+            - warehouses
+            - orders
+            - order_rows
+            - drones
+            - last_turns
+            - states
+    """
+
+    """ Constructor """
+
+    def __init__(self, challenge: Challenge):
+        self.deadline = challenge.deadline
+        self.warehouses = {warehouse.id: warehouse.location for warehouse in challenge.warehouses}
+        self.orders = challenge.orders
+        self.order_rows = {order.id: row for row, order in enumerate(challenge.orders)}
+        # Turn and location of each drone after its last action
+        start = challenge.warehouses[0].location
+        self.drones = {drone.id: (0, start) for drone in challenge.drones}
+        # Last delivery turn of each order up to its completion (-1 before its first delivery)
+        self.last_turns = array('q', [-1]) * len(challenge.orders)
+        # State of each order (see ORDER_COMPLETED and ORDER_BROKEN)
+        self.states = bytearray(len(challenge.orders))
+
+    def add(self, drone_id: int, opcode: int, target: int, product: int, quantity: int) -> None:
+        """
+            - Plays the next action of a drone
+        """
+        if drone_id not in self.drones:
+            return
+
+        turns, pos = self.drones[drone_id]
+
+        if opcode == LOAD or opcode == UNLOAD:
+            next_pos = self.warehouses[target]
+            # Distance flown plus 1 turn for the action itself
+            turns += Challenge.calculate_distance(pos, next_pos) + 1
+
+        elif opcode == DELIVER:
+            row = self.order_rows[target]
+            order = self.orders[row]
+            next_pos = order.location
+            turns += Challenge.calculate_distance(pos, next_pos)
+
+            # The deliveries after the completion of the order do not count
+            if not self.states[row] & ORDER_COMPLETED:
+                self.last_turns[row] = max(self.last_turns[row], turns)
+
+            # Removing the given products from the order list
+            if product in order.products:
+                order.receive(product, quantity)
+            else:
+                self.states[row] |= ORDER_BROKEN
+
+            turns += 1
+
+            if self.states[row] == 0 and order.is_completed():
+                self.states[row] = ORDER_COMPLETED
+
+        elif opcode == WAIT:
+            self.drones[drone_id] = (turns + target, pos)
+            return
+
+        else:
+            return
+
+        self.drones[drone_id] = (turns, next_pos)
+
+    def score(self) -> int:
+        """
+            - Score of the actions played so far
+            :return:        The score
+        """
+        score = 0
+
+        for row, order in enumerate(self.orders):
+            if self.last_turns[row] >= 0 and not self.states[row] & ORDER_BROKEN and order.is_completed():
+                score += ceil(((self.deadline - self.last_turns[row]) / self.deadline) * 100)
+
+        return score
+
+
+def pack_challenge(np, challenge: Challenge) -> dict:
+    """
+        - Converts the information of the challenge needed for the scoring into arrays
+        - The products needed by the orders are stored like a sparse matrix: the needs of the order i are
+          need_products[need_offsets[i]:need_offsets[i + 1]] and need_quantities[need_offsets[i]:need_offsets[i + 1]]
+        :return:        The arrays of the challenge, by name
+    """
+    # Fetches the index of a warehouse / an order from its ID
+    warehouse_index = np.full(max(w.id for w in challenge.warehouses) + 1, -1, dtype=np.int64)
+    warehouse_index[[w.id for w in challenge.warehouses]] = np.arange(len(challenge.warehouses))
+
+    order_index = np.full(max((o.id for o in challenge.orders), default=0) + 1, -1, dtype=np.int64)
+    order_index[[o.id for o in challenge.orders]] = np.arange(len(challenge.orders))
+
+    need_offsets = [0]
+    need_products = []
+    need_quantities = []
+
+    for order in challenge.orders:
+        for product, quantity in sorted(order.products.items()):
+            need_products.append(product)
+            need_quantities.append(quantity)
+        need_offsets.append(len(need_products))
+
+    return {
+        'warehouse_index': warehouse_index,
+        'order_index': order_index,
+        'warehouse_locations': np.array([w.location for w in challenge.warehouses], dtype=np.int64).reshape(-1, 2),
+        'order_locations': np.array([o.location for o in challenge.orders], dtype=np.int64).reshape(-1, 2),
+        'need_offsets': np.array(need_offsets, dtype=np.int64),
+        'need_products': np.array(need_products, dtype=np.int64),
+        'need_quantities': np.array(need_quantities, dtype=np.int64),
+        'start': np.array(challenge.warehouses[0].location, dtype=np.int64),
+        'products_count': len(challenge.product_weights),
+    }
+
+
+def pack_actions(np, solution: ActionBuffer, challenge: Challenge):
+    """
+        - Reads the packed actions of the solution (without copying the buffer), and sorts them in the order of the
+          simulation: the drones of the challenge one after the other, each one with its actions in order.
+          The actions of unknown drones are ignored, as in the reference simulator
+        :return:        An array of shape (actions, 5)
+    """
+    actions = np.frombuffer(solution.data, dtype=np.intc).reshape(-1, FIELDS).astype(np.int64)
+
+    # Rank of each drone in the simulation
+    drone_ids = np.array([drone.id for drone in challenge.drones], dtype=np.int64)
+    rank = np.full(max(int(drone_ids.max(initial=0)), int(actions[:, 0].max(initial=0))) + 1, -1, dtype=np.int64)
+    rank[drone_ids] = np.arange(len(drone_ids))
+
+    ranks = rank[np.maximum(actions[:, 0], 0)]
+    ranks[actions[:, 0] < 0] = -1
+    actions = actions[ranks >= 0]
+    ranks = ranks[ranks >= 0]
+
+    # Stable sort, so the actions of each drone stay in order
+    return actions[np.argsort(ranks, kind='stable')]
+
+
+def need_table_keys(np, tables: dict):
+    """
+        - Sparse (order, product) keys of the needs of the orders (sorted, the products of each order being sorted)
+        :return:        The row of the order of each need, and the key of each need
+    """
+    offsets = tables['need_offsets']
+    need_orders = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+    return need_orders, need_orders * tables['products_count'] + tables['need_products']
+
+
+def check_deliveries(np, actions, tables: dict) -> None:
+    """
+        - Checks that every delivered product is needed by its order, so the accelerated backends fail on the same
+          solutions as score_solution (which raises a KeyError when an order receives a product it has not asked for)
+    """
+    deliveries = actions[actions[:, 1] == DELIVER]
+    if len(deliveries) == 0:
+        return
+
+    products = deliveries[:, 3]
+    _, need_keys = need_table_keys(np, tables)
+    keys = tables['order_index'][deliveries[:, 2]] * tables['products_count'] + products
+
+    position = np.minimum(np.searchsorted(need_keys, keys), max(len(need_keys) - 1, 0))
+    known = (products >= 0) & (products < tables['products_count'])
+    known &= need_keys[position] == keys if len(need_keys) else False
+
+    if not known.all():
+        raise KeyError(int(products[np.argmin(known)]))
+
+
+def _score_numpy(np, actions, tables: dict, deadline: int) -> int:
+    """
+        - Vectorized scoring: cumulative turns of each drone with cumulative sums, and completion of each order with
+          reductions on the deliveries sorted by (order, product)
+        :return:        The score of the solution
+    """
+    count = len(actions)
+
+    if count == 0:
+        return 0
+
+    drones, opcodes, targets, products, quantities = actions.T
+    rows = np.arange(count)
+
+    # Start of the actions of each drone
+    first = np.ones(count, dtype=bool)
+    first[1:] = drones[1:] != drones[:-1]
+    group_start = np.flatnonzero(first)[np.cumsum(first) - 1]
+
+    on_warehouse = (opcodes == LOAD) | (opcodes == UNLOAD)
+    on_order = opcodes == DELIVER
+    moving = on_warehouse | on_order
+
+    # Location of each action (only meaningful for the moving ones)
+    warehouses = tables['warehouse_index'][np.where(on_warehouse, targets, 0)]
+    orders = tables['order_index'][np.where(on_order, targets, 0)]
+    locations = np.where(
+        on_warehouse[:, None],
+        tables['warehouse_locations'][warehouses],
+        tables['order_locations'][orders] if len(tables['order_locations']) else 0
+    )
+
+    # Location of the drone before each action: the location of the previous moving action of the same drone,
+    # or the first warehouse
+    last_move = np.maximum.accumulate(np.where(moving, rows, -1))
+    previous = np.concatenate(([-1], last_move[:-1]))
+    from_start = previous < group_start
+    positions = np.where(from_start[:, None], tables['start'], locations[np.maximum(previous, 0)])
+
+    # Distance flown plus 1 turn for the action itself, or the waiting turns
+    delta = locations - positions
+    distances = np.ceil(np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])).astype(np.int64)
+    costs = np.where(moving, distances + 1, np.where(opcodes == WAIT, targets, 0))
+
+    # Cumulative turns of each drone
+    totals = np.cumsum(costs)
+    turns = totals - (totals[group_start] - costs[group_start])
+
+    # Deliveries, in the order of the simulation
+    deliveries = np.flatnonzero(on_order)
+    if len(deliveries) == 0:
+        return 0
+
+    delivery_orders = orders[deliveries]
+    delivery_turns = turns[deliveries] - 1
+    delivery_quantities = quantities[deliveries]
+
+    # Sparse (order, product) keys of the needs and of the deliveries (every delivered product is needed by its
+    # order, see check_deliveries)
+    offsets = tables['need_offsets']
+    need_orders, need_keys = need_table_keys(np, tables)
+    need_quantities = tables['need_quantities']
+    delivery_keys = delivery_orders * tables['products_count'] + products[deliveries]
+    position = np.searchsorted(need_keys, delivery_keys)
+
+    # Remaining quantity of each (order, product) after each delivery
+    by_key = np.argsort(delivery_keys, kind='stable')
+    keys = position[by_key]
+    delivered = np.cumsum(delivery_quantities[by_key])
+    key_first = np.ones(len(by_key), dtype=bool)
+    key_first[1:] = keys[1:] != keys[:-1]
+    key_start = np.flatnonzero(key_first)[np.cumsum(key_first) - 1]
+    delivered -= delivered[key_start] - delivery_quantities[by_key][key_start]
+    remaining = need_quantities[keys] - delivered
+
+    # First delivery after which each (order, product) is fulfilled (-1 if it already was, never if it is not)
+    never = len(deliveries)
+    fulfilled = np.where(need_quantities == 0, -1, never)
+    reached = remaining == 0
+    np.minimum.at(fulfilled, keys[reached], by_key[reached])
+
+    final = need_quantities.copy()
+    np.subtract.at(final, keys, delivery_quantities[by_key])
+
+    # Orders completed at the end of the simulation
+    orders_count = len(offsets) - 1
+    unfulfilled = np.zeros(orders_count, dtype=np.int64)
+    np.add.at(unfulfilled, need_orders, final != 0)
+    completed = unfulfilled == 0
+
+    # The order is completed during the first delivery at this order once all its products are fulfilled
+    completion = np.full(orders_count, -1, dtype=np.int64)
+    np.maximum.at(completion, need_orders, fulfilled)
+    first_delivery = np.full(orders_count, never, dtype=np.int64)
+    np.minimum.at(first_delivery, delivery_orders, np.arange(len(deliveries)))
+    completion = np.maximum(completion, first_delivery)
+
+    # Last delivery turn of each order, up to its completion
+    recorded = np.arange(len(deliveries)) <= completion[delivery_orders]
+    last_turn = np.full(orders_count, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last_turn, delivery_orders[recorded], delivery_turns[recorded])
+
+    scored = completed & (last_turn > np.iinfo(np.int64).min)
+    points = np.ceil(((deadline - last_turn[scored]) / deadline) * 100).astype(np.int64)
+
+    return int(points.sum())
+
+
+def _score_loop(actions, warehouse_index, order_index, warehouse_locations, order_locations,
+                need_offsets, need_products, need_quantities, start, deadline):
+    """
+        - Scoring kernel running the simulation action by action, like the reference simulator, on arrays only.
+          It is compiled by Numba when it is installed
+        :return:        The score of the solution
+    """
+    orders_count = len(need_offsets) - 1
+    remaining = need_quantities.copy()
+
+    # Amount of products of each order which are not exactly fulfilled
+    unfulfilled = [0] * orders_count
+    for order in range(orders_count):
+        for need in range(need_offsets[order], need_offsets[order + 1]):
+            if remaining[need] != 0:
+                unfulfilled[order] += 1
+
+    completed = [False] * orders_count
+    recorded = [False] * orders_count
+    last_turn = [0] * orders_count
+
+    drone = -1
+    turns = 0
+    x = 0
+    y = 0
+
+    for i in range(len(actions)):
+        # Next drone, back to the first warehouse
+        if actions[i, 0] != drone:
+            drone = actions[i, 0]
+            turns = 0
+            x = start[0]
+            y = start[1]
+
+        opcode = actions[i, 1]
+        target = actions[i, 2]
+
+        if opcode == LOAD or opcode == UNLOAD:
+            warehouse = warehouse_index[target]
+            next_x = warehouse_locations[warehouse, 0]
+            next_y = warehouse_locations[warehouse, 1]
+            turns += int(ceil(sqrt((x - next_x) ** 2 + (y - next_y) ** 2))) + 1
+
+        elif opcode == DELIVER:
+            order = order_index[target]
+            next_x = order_locations[order, 0]
+            next_y = order_locations[order, 1]
+            turns += int(ceil(sqrt((x - next_x) ** 2 + (y - next_y) ** 2)))
+
+            if not completed[order]:
+                if not recorded[order] or turns > last_turn[order]:
+                    last_turn[order] = turns
+                recorded[order] = True
+
+            # Removing the given products from the order needs (every delivered product is needed by its order, see
+            # check_deliveries)
+            for need in range(need_offsets[order], need_offsets[order + 1]):
+                if need_products[need] == actions[i, 3]:
+                    before = remaining[need]
+                    remaining[need] -= actions[i, 4]
+                    if before == 0 and remaining[need] != 0:
+                        unfulfilled[order] += 1
+                    elif before != 0 and remaining[need] == 0:
+                        unfulfilled[order] -= 1
+                    break
+
+            turns += 1
+
+            if not completed[order] and unfulfilled[order] == 0:
+                completed[order] = True
+
+        elif opcode == WAIT:
+            turns += target
+            continue
+
+        else:
+            continue
+
+        x = next_x
+        y = next_y
+
+    score = 0
+    for order in range(orders_count):
+        if recorded[order] and unfulfilled[order] == 0:
+            score += int(ceil(((deadline - last_turn[order]) / deadline) * 100))
+
+    return score
+
+
+def fast_score_solution(solution: ActionBuffer | list[Action], challenge: Challenge, backend: str = None) -> int:
+    """
+        Calculates the score for a given solution, with the same result as score_solution (and the same KeyError
+        for a product delivered to an order which has not asked for it), but without modifying the challenge.
+        The backend can be:
+            - 'numba': the simulation kernel compiled by Numba
+            - 'numpy': the vectorized simulation
+            - 'python': the reference simulator
+            - 'auto': the fastest installed backend
+        By default, the backend chosen with set_default_backend is used (the reference simulator if none was chosen,
+        so the accelerators are not loaded)
+        :return:        The score of the solution
+    """
+    global _jit_kernel
+
+    backend = backend or default_backend
+
+    if backend == 'python':
+        return score_solution(solution, deepcopy(challenge))
+
+    np = get_numpy()
+
+    if backend == 'auto':
+        backend = 'python' if np is None else 'numba' if get_numba() is not None else 'numpy'
+
+        if backend == 'python':
+            return score_solution(solution, deepcopy(challenge))
+
+    if np is None:
+        raise ImportError(f'NumPy is needed by the \'{backend}\' scoring backend')
+
+    if not isinstance(solution, ActionBuffer):
+        solution = ActionBuffer(solution)
+
+    tables = pack_challenge(np, challenge)
+    actions = pack_actions(np, solution, challenge)
+    check_deliveries(np, actions, tables)
+
+    if backend == 'numpy':
+        return _score_numpy(np, actions, tables, challenge.deadline)
+
+    if backend == 'numba':
+        numba = get_numba()
+        if numba is None:
+            raise ImportError('Numba is needed by the \'numba\' scoring backend')
+
+        if _jit_kernel is None:
+            _jit_kernel = numba.njit(cache=True)(_score_loop)
+
+        return _jit_kernel(actions, tables['warehouse_index'], tables['order_index'], tables['warehouse_locations'],
+                           tables['order_locations'], tables['need_offsets'], tables['need_products'],
+                           tables['need_quantities'], tables['start'], challenge.deadline)
+
+    raise ValueError(f'Unknown scoring backend \'{backend}\'')
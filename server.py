@@ -0,0 +1,514 @@
+"""
+@title : Server
+@description : Local solving server, keeping the parsed challenges and a pool of worker processes between the requests
+"""
+
+from parser import parse_challenge, parse_challenge_text
+from utils.Challenge import Challenge
+from utils.ChallengeCache import ChallengeCache
+from utils.SharedChallenge import SharedChallenge
+from utils.SegmentCache import SegmentCache
+from utils.SolverConfig import SolverConfig
+from strategies import strategy_names, run_strategy
+from utils.ActionBuffer import ActionBuffer
+from utils.instrumentation import register, report
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from copy import deepcopy
+from functools import partial
+from typing import Callable
+from urllib.parse import urlsplit, parse_qs
+import asyncio
+import json
+import os
+import signal
+import time
+
+# Algorithms which can be requested ('anytime' tries all of them until the time limit)
+STRATEGIES = strategy_names() + ['anytime']
+
+# Time budget of a request when none is given (in seconds)
+DEFAULT_TIME_LIMIT = 60
+# Extra time given to a worker to send back its solution (or its timeout) after the time limit
+ANYTIME_GRACE = 5
+
+# Amount of lines of the solution sent in each chunk of the response
+LINES_PER_CHUNK = 2000
+
+# Challenges kept by each worker process (with the segments built for them), by name of their shared memory
+WORKER_CACHE_SIZE = 8
+_challenges = OrderedDict()
+
+STATUS_TEXTS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error', 504: 'Gateway Timeout'}
+
+
+class RequestError(Exception):
+    """
+        Error of a request, sent back with its HTTP status
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def init_worker() -> None:
+    """
+        - Prepares a worker process: the signals it receives (SIGALRM of the time limits, SIGTERM of the processes
+          it stops) must not be written to the signal socket of the event loop inherited from the server, which
+          would take them for its own
+    """
+    signal.set_wakeup_fd(-1)
+
+
+def worker_challenge(shared: SharedChallenge) -> tuple[Challenge, SegmentCache]:
+    """
+        - Fetches a challenge in a worker process, only read from shared memory the first time
+        - The segment cache of the challenge is dropped with it, so the segments are only reused for the same challenge
+        - The challenge reads its distance matrix from the shared block, which stays open until the challenge is
+          dropped from the cache of the worker
+        :return:        The challenge (which must not be modified) and its segment cache
+    """
+    if shared.name in _challenges:
+        _challenges.move_to_end(shared.name)
+    else:
+        _challenges[shared.name] = (shared.to_challenge(), SegmentCache())
+
+        while len(_challenges) > WORKER_CACHE_SIZE:
+            challenge, _ = _challenges.popitem(last=False)[1]
+            challenge.shared.close()
+
+    return _challenges[shared.name]
+
+
+def publish_challenge(parse: Callable[[], Challenge]) -> SharedChallenge:
+    """
+        - Parses a challenge and publishes it in shared memory
+        :return:        The challenge, in shared memory
+    """
+    return SharedChallenge.publish(parse())
+
+
+def solve_request(shared: SharedChallenge, strategy: str, time_limit: float,
+                  values: dict) -> tuple[ActionBuffer | None, int | None, float, dict]:
+    """
+        - Solves a challenge with an algorithm, in a worker process
+        - The algorithms are stopped at the time limit (by SIGALRM, like in anytime_solve), so the worker is free
+          for the next request as soon as the budget is spent
+        :return:        The solution, its score, the solving time (in seconds), the solution and the score being
+                        None if the time limit was reached first, and the statistics of the segment caches of the
+                        worker (see segment_cache_stats)
+    """
+    # Imported here, so the server starts without loading the algorithms (the workers load them once)
+    from solver import anytime_solve, SolveInterrupted
+    from scoring import fast_score_solution
+
+    challenge, segment_cache = worker_challenge(shared)
+    config = SolverConfig.from_dict(values)
+    before = segment_cache.stats()
+    start = time.perf_counter()
+
+    if strategy == 'anytime':
+        # Stops by itself at its time limit, with the best solution found so far (its stack_segments solution reuses
+        # the segments of the previous requests on the same challenge). The request already runs in a worker
+        # process, the zones of layers are solved one by one
+        solution = anytime_solve(deepcopy(challenge), None, time_limit, config=config, cache=segment_cache,
+                                 workers=1)
+    else:
+        previous_handler = signal.signal(signal.SIGALRM, _budget_exceeded)
+
+        try:
+            try:
+                signal.setitimer(signal.ITIMER_REAL, max(time_limit, 0.001))
+
+                if strategy == 'layers':
+                    # The request already runs in a worker process, the zones are solved one by one
+                    solution = run_strategy(strategy, deepcopy(challenge), config, workers=1)
+                elif strategy == 'stack_segments':
+                    # The segments of the previous requests on the same challenge are reused
+                    solution = run_strategy(strategy, deepcopy(challenge), config, cache=segment_cache)
+                else:
+                    solution = run_strategy(strategy, deepcopy(challenge), config)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except SolveInterrupted:
+            solution = None
+        finally:
+            signal.signal(signal.SIGALRM, previous_handler)
+
+    seconds = time.perf_counter() - start
+    cache_stats = segment_cache_stats(before, segment_cache.stats())
+
+    if solution is None:
+        return None, None, seconds, cache_stats
+
+    return solution, fast_score_solution(solution, challenge, 'auto'), seconds, cache_stats
+
+
+def segment_cache_stats(before: dict[str, int], after: dict[str, int]) -> dict[str, int]:
+    """
+        - Statistics of the segment caches of a worker process for a request: the hits, misses and invalidations of
+          the request (the difference between the stats of the cache before and after it), and the amount of
+          segments stored by all the caches of the worker
+        :return:        The statistics, with the process ID of the worker
+    """
+    stats = {name: after[name] - before[name] for name in ('hits', 'misses', 'invalidations')}
+    stats['size'] = sum(cache.stats()['size'] for _, cache in _challenges.values())
+    stats['pid'] = os.getpid()
+
+    return stats
+
+
+def _budget_exceeded(signal_number, frame):
+    """
+        Signal handler stopping an algorithm at the time limit of its request
+    """
+    from solver import SolveInterrupted
+    raise SolveInterrupted('time limit')
+
+
+class SegmentCacheTotals:
+    """
+        Statistics of the segment caches of all the worker processes, added up from the results of their requests
+        (the caches themselves stay in the workers)
+
+        Class is defined by:
+            - hits
+            - misses
+            - invalidations
+            - sizes
+    """
+
+    """ Constructor """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Process ID of each worker -> amount of segments stored by its caches after its last request
+        self.sizes = {}
+
+    def add(self, stats: dict[str, int]) -> None:
+        """
+            - Adds the statistics of a request (see segment_cache_stats)
+        """
+        self.hits += stats['hits']
+        self.misses += stats['misses']
+        self.invalidations += stats['invalidations']
+        self.sizes[stats['pid']] = stats['size']
+
+    def stats(self) -> dict[str, int]:
+        """
+            - Statistics of the segment caches of all the workers
+            :return:        The amount of hits, misses, invalidations and stored segments
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'size': sum(self.sizes.values()),
+        }
+
+
+class SolveServer:
+    """
+        An asyncio server answering HTTP requests (on a TCP port or a UNIX socket):
+            - POST /solve with the content of a challenge file, or GET /solve?challenge=path of a local file
+              Optional parameters: strategy (default stack_segments), time_limit (seconds), and the constants of
+              SolverConfig (nb_zones, ...)
+              The solution is streamed back in the output file format, the score being in the 'X-Score' header
+            - GET /stats gives the statistics of the server and of its caches (JSON)
+        The parsed challenges are kept in shared memory (see ChallengeCache), and solved by a pool of worker
+        processes which keep them between the requests, so a repeated request only pays for the solving.
+
+        Class is defined by:
+            - cache
+            - segment_caches
+            - executor
+            - time_limit
+            - requests
+            - errors
+    """
+
+    """ Constructor """
+
+    def __init__(self, workers: int = None, cache_size: int = 8, time_limit: float = DEFAULT_TIME_LIMIT):
+        self.cache = ChallengeCache(cache_size)
+        self.segment_caches = SegmentCacheTotals()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        self.time_limit = time_limit
+        self.requests = 0
+        self.errors = 0
+        # Only one challenge is parsed at a time
+        self.parse_lock = asyncio.Lock()
+
+        register('challenge_cache', self.cache)
+        register('segment_cache', self.segment_caches)
+        register('server', self)
+
+    def stats(self) -> dict[str, int]:
+        """
+            - Statistics of the server
+            :return:        The amount of requests and of errors
+        """
+        return {'requests': self.requests, 'errors': self.errors}
+
+    def close(self) -> None:
+        """
+            - Stops the workers and frees the shared memory
+        """
+        self.executor.shutdown(cancel_futures=True)
+        self.cache.clear()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+            - Answers the requests of a connection, until the client closes it
+        """
+        try:
+            while True:
+                request = await read_request(reader)
+
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                self.requests += 1
+
+                try:
+                    await self.route(method, target, body, writer)
+                except RequestError as error:
+                    self.errors += 1
+                    await send_json(writer, error.status, {'error': str(error)})
+                except Exception as error:
+                    self.errors += 1
+                    await send_json(writer, 500, {'error': f'{type(error).__name__}: {error}'})
+
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, target: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        """
+            - Calls the handler of the requested path
+        """
+        url = urlsplit(target)
+        parameters = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/stats':
+            await send_json(writer, 200, report())
+        elif url.path == '/solve':
+            if method not in {'GET', 'POST'}:
+                raise RequestError(405, f'Unsupported method {method}')
+            await self.solve(parameters, body, writer)
+        else:
+            raise RequestError(404, f'Unknown path {url.path}')
+
+    async def solve(self, parameters: dict[str, str], body: bytes, writer: asyncio.StreamWriter) -> None:
+        """
+            - Solves the challenge of the request in a worker process, and streams back the solution
+        """
+        strategy = parameters.pop('strategy', 'stack_segments')
+        if strategy not in STRATEGIES:
+            raise RequestError(400, f'Unknown strategy {strategy} (expected one of {", ".join(STRATEGIES)})')
+
+        try:
+            time_limit = float(parameters.pop('time_limit', self.time_limit))
+            values = {key: None if value == 'None' else float(value) for key, value in parameters.items()
+                      if key != 'challenge'}
+            if values.get('nb_zones') is not None:
+                values['nb_zones'] = int(values['nb_zones'])
+        except ValueError as error:
+            raise RequestError(400, f'Invalid parameter: {error}')
+
+        loop = asyncio.get_running_loop()
+
+        # Fetching the challenge from the cache (parsed in a thread, so the other requests are not blocked)
+        async with self.parse_lock:
+            if 'challenge' in parameters:
+                filename = parameters['challenge']
+                try:
+                    key = await loop.run_in_executor(None, self.cache.file_hash, filename)
+                except OSError as error:
+                    raise RequestError(404, f'Cannot read {filename}: {error.strerror}')
+                parse = partial(parse_challenge, filename)
+            elif len(body) > 0:
+                try:
+                    text = body.decode()
+                except UnicodeDecodeError as error:
+                    raise RequestError(400, f'Invalid challenge: not UTF-8 text ({error.reason} at byte {error.start})')
+                key = ChallengeCache.text_hash(body)
+                parse = partial(parse_challenge_text, text)
+            else:
+                raise RequestError(400, 'No challenge given (request body or challenge parameter)')
+
+            shared = self.cache.get(key)
+            hit = shared is not None
+
+            if not hit:
+                try:
+                    shared = await loop.run_in_executor(None, publish_challenge, parse)
+                except (ValueError, IndexError) as error:
+                    raise RequestError(400, f'Invalid challenge: {error}')
+                self.cache.put(key, shared)
+
+        try:
+            # The worker stops the algorithm at the time limit by itself, the grace only covers a stuck worker
+            future = self.executor.submit(solve_request, shared, strategy, time_limit, values)
+
+            try:
+                solution, score, seconds, cache_stats = await asyncio.wait_for(
+                    asyncio.wrap_future(future), time_limit + ANYTIME_GRACE
+                )
+            except asyncio.TimeoutError:
+                future.cancel()
+                raise RequestError(504, f'No solution within {time_limit} seconds (worker not responding)')
+        finally:
+            self.cache.release(key)
+
+        self.segment_caches.add(cache_stats)
+
+        if solution is None:
+            raise RequestError(504, f'No solution within {time_limit} seconds')
+
+        await send_solution(writer, solution, {
+            'X-Score': score,
+            'X-Strategy': strategy,
+            'X-Solve-Time': f'{seconds:.3f}',
+            'X-Cache': 'hit' if hit else 'miss',
+        })
+
+
+async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, dict[str, str], bytes] | None:
+    """
+        - Reads an HTTP request
+        :return:        The method, the target, the headers (lower case names) and the body,
+                        or None if the connection is closed
+    """
+    line = await reader.readline()
+
+    if not line.strip():
+        return None
+
+    try:
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise ConnectionError('Malformed request line')
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in {b'\r\n', b'\n', b''}:
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+    return method.upper(), target, headers, body
+
+
+async def send_json(writer: asyncio.StreamWriter, status: int, content) -> None:
+    """
+        - Sends a JSON response
+    """
+    body = json.dumps(content).encode()
+    writer.write(
+        f'HTTP/1.1 {status} {STATUS_TEXTS[status]}\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+    )
+    await writer.drain()
+
+
+async def send_solution(writer: asyncio.StreamWriter, solution: ActionBuffer, headers: dict) -> None:
+    """
+        - Streams a solution in the output file format, in chunks of lines (chunked transfer encoding)
+    """
+    writer.write(
+        ('HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nTransfer-Encoding: chunked\r\n' +
+         ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n').encode()
+    )
+
+    lines = [str(len(solution))]
+
+    for line in solution.lines():
+        lines.append(line)
+
+        if len(lines) >= LINES_PER_CHUNK:
+            await send_chunk(writer, lines)
+            lines = []
+
+    await send_chunk(writer, lines)
+    writer.write(b'0\r\n\r\n')
+    await writer.drain()
+
+
+async def send_chunk(writer: asyncio.StreamWriter, lines: list[str]) -> None:
+    """
+        - Sends lines as one chunk of a response
+    """
+    if len(lines) == 0:
+        return
+
+    data = ('\n'.join(lines) + '\n').encode()
+    writer.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+    await writer.drain()
+
+
+async def serve(host: str = '127.0.0.1', port: int = 8000, unix: str = None, workers: int = None,
+                cache_size: int = 8, time_limit: float = DEFAULT_TIME_LIMIT) -> None:
+    """
+        - Runs the server until SIGINT / SIGTERM
+    """
+    server = SolveServer(workers, cache_size, time_limit)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    try:
+        if unix is not None:
+            listener = await asyncio.start_unix_server(server.handle, path=unix)
+            print(f'Listening on {unix}')
+        else:
+            listener = await asyncio.start_server(server.handle, host, port)
+            print(f'Listening on http://{host}:{port}')
+
+        async with listener:
+            await stop.wait()
+    finally:
+        server.close()
+
+        if unix is not None and os.path.exists(unix):
+            os.remove(unix)
+
+
+def main(arguments: list[str] = None) -> None:
+    """
+        Command line of the server (python main.py serve ...)
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='main.py serve', description='Run a local solving server.')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='address to listen on')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='TCP port to listen on')
+    parser.add_argument('--unix', type=str, default=None,
+                        help='UNIX socket path to listen on (instead of the TCP port)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='amount of worker processes (all the cores by default)')
+    parser.add_argument('--cache-size', type=int, default=8,
+                        help='amount of challenges kept in memory')
+    parser.add_argument('--time-limit', type=float, default=DEFAULT_TIME_LIMIT,
+                        help='default time budget of a request (in seconds)')
+    args = parser.parse_args(arguments)
+
+    asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.cache_size, args.time_limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,107 +8,126 @@ from utils.Warehouse import Warehouse
 from utils.Order import Order
 from utils.Drone import Drone
 from utils.types import Action
+from utils.ActionBuffer import ActionBuffer, LOAD, DELIVER, format_action
 from utils.Segment import Segment
-from math import sqrt, ceil
+from utils.SolverConfig import SolverConfig, DEFAULT_CONFIG
+from math import sqrt
 from copy import deepcopy
-
-
-def save_solution(file_name: str, solution: list[Action]) -> None:
+from functools import partial
+import os
+import shutil
+import signal
+import threading
+import time
+from typing import Iterable, Iterator, TYPE_CHECKING
+
+# Each algorithm only imports what it uses, so running one algorithm does not load the others (see strategies.py):
+# the clustering by layers, multiprocessing (and the shared memory) by layers when the zones are solved in parallel,
+# the heaps by workload_repartition and product_by_product, the segment cache when one is given, and the scoring by
+# solve, anytime_solve and stream_solution
+if TYPE_CHECKING:
+    from utils.SharedChallenge import SharedChallenge
+    from utils.SegmentCache import SegmentCache
+    from utils.DemandIndex import DemandIndex
+
+# Maximum distance between the orders delivered in the same trip by product_by_product
+PRODUCT_CLUSTER_RADIUS = 80
+
+
+def save_solution(file_name: str, solution: ActionBuffer | list[Action]) -> None:
     """
         Saves the given list of actions in the given file location
     """
-    with open(f'{file_name}.txt', 'w') as outfile:
+    if not isinstance(solution, ActionBuffer):
+        solution = ActionBuffer(solution)
+
+    # Writing in a temporary file first, so the file is never left half written
+    temporary_name = f'{file_name}.txt.tmp'
+
+    with open(temporary_name, 'w') as outfile:
         outfile.write(str(len(solution)) + '\n')
-        for i in range(len(solution)):
-            for j in range(len(solution[i])):
-                outfile.write(str(solution[i][j]) + ' ')
-            outfile.write('\n')
+        for line in solution.lines():
+            outfile.write(line + '\n')
 
+    os.replace(temporary_name, f'{file_name}.txt')
 
-def score_solution(solution: list[Action], challenge: Challenge) -> int:
+
+def stream_solution(file_name: str, rows: Iterable[tuple[int, int, int, int, int]],
+                    challenge: Challenge = None) -> int | None:
     """
-        Calculates the score for a given solution
-        :return:        The score of the solution
+        Saves a stream of packed actions (drone, opcode, target, product, quantity) in the given file location, in
+        one pass: each action is written (and scored if the challenge is given) as soon as it is produced, so the
+        solution is never stored as a whole.
+        The amount of actions (first line of the file) is only known at the end, so the lines are written in a
+        temporary file first, then copied after it: every line is written twice, a copy by blocks from disk to disk
+        which is the price of keeping only one action in memory (a padded count written first and filled in at the
+        end would make the file differ from the one of save_solution). The temporary files are removed even if the
+        actions or their scoring raise, the output file being only replaced once the whole solution is written.
+        :return:        The score of the solution if the challenge is given (see StreamScorer)
     """
-    score = 0
+    from scoring import StreamScorer
 
-    orders = {order.id:order for order in challenge.orders}
+    scorer = StreamScorer(challenge) if challenge is not None else None
+    count = 0
 
-    # Saves the completed orders, so they don't count if there is a delivery afterward
-    completed_orders = []
+    lines_name = f'{file_name}.txt.lines.tmp'
+    temporary_name = f'{file_name}.txt.tmp'
 
-    # Saves the turns where there have been a delivery at a specific order
-    order_turns = {}
+    try:
+        with open(lines_name, 'w') as lines:
+            for row in rows:
+                lines.write(format_action(*row) + '\n')
+                count += 1
 
-    for drone in challenge.drones:
-        # We are only looking at the moves of the given drone
-        moves = list(filter(lambda move: move[0] == drone.id, solution))
-
-        turns = 0
-
-        # Initial position
-        pos = challenge.warehouses[0].location
-
-        # For every action
-        for move in moves:
-            # If the action is on a warehouse
-            if move[1] in {'L', 'U'}:
-                # If the next location is a warehouse
-                next_pos = list(filter(lambda w: w.id == move[2], challenge.warehouses))[0].location
-                # Distance flown plus 1 turn for the action itself
-                turns += Challenge.calculate_distance(pos, next_pos) + 1
-
-            # If the action is on an order
-            elif move[1] == 'D':
-                # If the action is on an order
-                next_pos = orders[move[2]].location
-                # Distance flown
-                turns += Challenge.calculate_distance(pos, next_pos)
-
-                # Insert the delivery action in the delivery turns
-                if move[2] not in completed_orders:
-                    if move[2] not in order_turns.keys():
-                        order_turns[move[2]] = [turns]
-                    else:
-                        order_turns[move[2]].append(turns)
+                if scorer is not None:
+                    scorer.add(*row)
+
+        with open(lines_name, 'r') as lines, open(temporary_name, 'w') as outfile:
+            outfile.write(str(count) + '\n')
+            shutil.copyfileobj(lines, outfile)
 
-                # Removing the given products from the order list
-                orders[move[2]].products[move[3]] -= move[4]
+        os.replace(temporary_name, f'{file_name}.txt')
+    finally:
+        # The temporary file is already renamed if everything went well
+        for name in (lines_name, temporary_name):
+            if os.path.exists(name):
+                os.remove(name)
 
-                # Adding the delivery turn
-                turns += 1
+    return scorer.score() if scorer is not None else None
 
-                # If every product has been delivered
-                if move[2] not in completed_orders and orders[move[2]].is_completed():
-                    completed_orders.append(move[2])
 
-            # If the action is just waiting
-            elif move[1] == 'W':
-                turns += move[2]
-                continue
+def action_rows(assignments: Iterable[tuple[int, Segment]]) -> Iterator[tuple[int, int, int, int, int]]:
+    """
+        Streams the actions of the assigned segments, with the real drone IDs, as soon as each segment is assigned
+        :return:        The packed actions (drone, opcode, target, product, quantity)
+    """
+    for drone_id, segment in assignments:
+        for _, opcode, target, product, quantity in segment.actions.rows():
+            yield drone_id, opcode, target, product, quantity
 
-            # If there is a problem with the given action
-            else:
-                continue
 
-            # Updating the new drone location
-            pos = next_pos
+def collect_actions(assignments: Iterable[tuple[int, Segment]]) -> ActionBuffer:
+    """
+        Gathers the actions of the assigned segments in one list, with the real drone IDs
+        :return:        The solutions
+    """
+    solutions = ActionBuffer()
 
-    # Calculating the score for each completed order
-    for order, turns in order_turns.items():
-        if orders[order].is_completed():
-            score += ceil(((challenge.deadline - max(turns)) / challenge.deadline) * 100)
+    for drone_id, segment in assignments:
+        solutions.extend(segment.actions, drone_id)
 
-    return score
+    return solutions
 
 
-def path_for_order(challenge: Challenge, warehouses: list[Warehouse], order: Order, drone: Drone) -> list[Action]:
+def path_for_order(challenge: Challenge, warehouses: list[Warehouse], order: Order, drone: Drone,
+                   visited: set[int] = None) -> ActionBuffer:
     """
         Reused algorithm, used for calculating the most optimal path for a drone in order to deliver a given order
         depending on the challenge and the sorted list of warehouses
+        If given, 'visited' is filled with the IDs of the warehouses the drone has looked at
     """
     # The list of actions for this order
-    actions = []
+    actions = ActionBuffer()
 
     # Iterator for the warehouses
     warehouse_count = 0
@@ -119,17 +138,20 @@ def path_for_order(challenge: Challenge, warehouses: list[Warehouse], order: Ord
         while drone.current_load < challenge.max_payload and not drone.has_remaining(order):
             warehouse = warehouses[warehouse_count]
 
+            if visited is not None:
+                visited.add(warehouse.id)
+
             # For each needed product
             for product, amount in order.products.items():
                 # If the drone needs it and the warehouse has some
                 if not drone.has_product_asked(product, amount) and warehouse.products[product] > 0:
-                    # How many items will be taken
-                    to_load = min(warehouse.products[product], amount)
+                    # How many items will be taken (as much as possible the drone with the given product)
+                    free_units = (drone.max_payload - drone.current_load) // challenge.product_weights[product]
+                    to_load = min(warehouse.products[product], amount, free_units)
 
-                    # Loads as much as possible the drone with the given product
-                    for _ in range(to_load):
-                        if drone.can_load(product, 1, challenge.product_weights):
-                            drone.load(warehouse, product, 1, challenge.product_weights, actions)
+                    # Loads them in one action
+                    if to_load > 0:
+                        drone.load(warehouse, product, to_load, challenge.product_weights, actions)
 
             warehouse_count += 1
 
@@ -151,13 +173,53 @@ def path_for_order(challenge: Challenge, warehouses: list[Warehouse], order: Ord
     return actions
 
 
-def naive(challenge: Challenge) -> list[Action]:
+def order_segment(challenge: Challenge, order: Order, drone: Drone, cache: 'SegmentCache' = None) -> Segment:
+    """
+        Builds the segment delivering an order from its closest warehouses, or reuses the segment already built for
+        the same order, the same stock and the same load of the drone (if a cache of this challenge is given). In
+        both cases, the stock of the warehouses, the order and the load of the drone are updated.
+        :return:        The segment of the order
+    """
+    segment = cache.reuse(order, challenge.warehouses, drone) if cache is not None else None
+
+    if segment is not None:
+        return segment
+
+    # Versions and load before building the segment, used as the key of the cache
+    if cache is not None:
+        from utils.SegmentCache import drone_load
+
+        order_version = order.version
+        load = drone_load(drone)
+        versions = [warehouse.version for warehouse in challenge.warehouses]
+    visited = set()
+
+    # Sorted warehouses depending on their distance from the order
+    warehouses = sorted(
+        challenge.warehouses,
+        key=lambda w: Challenge.calculate_distance(w.location, order.location)
+    )
+
+    # Gets the actions for this order
+    actions = path_for_order(challenge, warehouses, order, drone, visited)
+
+    # When the order is completed, all its actions are added to the segment
+    segment = Segment(challenge.get_location(actions[0]), order.location, challenge, actions, order.id)
+
+    if cache is not None:
+        dependencies = {warehouse_id: versions[warehouse_id] for warehouse_id in visited}
+        cache.put(order, order_version, load, dependencies, segment, challenge.warehouses, drone)
+
+    return segment
+
+
+def naive(challenge: Challenge) -> ActionBuffer:
     """
         Naive algorithm. Every order has one drone, every drone is doing the same amount of order.
         For every order, the drone is taking as much as he can at the closest warehouses from the order.
         :return:        The solutions generated by the algorithm
     """
-    solutions = []
+    solutions = ActionBuffer()
 
     # For every order
     for count, order in enumerate(challenge.orders):
@@ -173,283 +235,312 @@ def naive(challenge: Challenge) -> list[Action]:
         # Gets the actions for this order
         order_actions = path_for_order(challenge, warehouses, order, drone)
 
-        for action in order_actions:
-            solutions.append(action)
+        solutions.extend(order_actions)
 
     return solutions
 
 
-def product_by_product(challenge: Challenge) -> list[Action]:
+def product_by_product(challenge: Challenge) -> ActionBuffer:
     """
-        This algorithm is counting the amount of products needed for all orders in the challenge. Then, after sorting
-        the products in order of the highest quantity, all the drones are loading and delivering one product at a time.
+        Product-major algorithm: the products are taken care of one after the other, the most needed first. The drone
+        which can be the earliest at a warehouse having the product in stock goes there, and takes it for
+        the nearest orders needing it (see product_trip), filling itself with the other products these orders need
+        from the same warehouse. The orders needing each product are kept by distance from each warehouse (see
+        DemandIndex), so they are never filtered nor sorted again.
         :return:        The solutions generated by the algorithm
     """
-    solutions = []
-
-    # Counting the needed amount for each product
-    total_quantity = {}
-
-    for order in challenge.orders:
-        for product, quantity in order.products.items():
-            total_quantity[product] = total_quantity.get(product, 0) + quantity
-
-    # Storing for each product the IDs of each warehouse that has this product in stock
-    product_warehouses = {}
+    from utils.DemandIndex import DemandIndex
 
-    for warehouse in challenge.warehouses:
-        for product in range(len(warehouse.products)):
-            if warehouse.products[product] > 0:
-                if product in product_warehouses.keys():
-                    product_warehouses[product].append(warehouse.id)
-                else:
-                    product_warehouses[product] = [warehouse.id]
+    solutions = ActionBuffer()
+    demand = DemandIndex(challenge)
 
-    # Sorting the products by the amount present in the orders
-    total_quantity_sorted = sorted(total_quantity.keys(), key=lambda p: total_quantity[p], reverse=True)
+    # Warehouses having each product in stock (the empty ones are dropped along the way)
+    products = demand.products()
+    product_warehouses = {p: [w for w in challenge.warehouses if w.products[p] > 0] for p in products}
 
-    # Saving the last drone used for the last product, so the algorithm can continue with the next drones for
-    # new products deliveries, without always using the same drones over and over again
-    last_drone = 0
+    for product in products:
+        # A product heavier than the payload can not be delivered
+        if challenge.product_weights[product] > challenge.max_payload:
+            continue
 
-    # For each product
-    for product in total_quantity_sorted:
-        # The maximum amount drones can carry for this specific product
-        can_load = challenge.max_payload // int(challenge.product_weights[product])
-        # While there are still some of this product to deliver
-        while total_quantity[product] > 0:
-            # If the last used drone was the last one, go back to the first one
-            if last_drone >= len(challenge.drones):
-                last_drone = 0
+        while demand.total(product) > 0:
+            warehouses = [w for w in product_warehouses[product] if w.products[product] > 0]
+            product_warehouses[product] = warehouses
 
-            drone = challenge.drones[last_drone]
-
-            # Sorting the warehouses depending on the distance with the drone
-            warehouses = sorted(
-                product_warehouses[product],
-                key=lambda w_id: Challenge.calculate_distance(drone.location, challenge.warehouses[w_id].location)
-            )
-
-            # Warehouse iterator
-            warehouse_count = 0
-
-            # While there are still products to deliver and the drone can load at least one product
-            while total_quantity[product] > 0 and drone.can_load(product, 1, challenge.product_weights):
-                # Will never get beyond the last warehouse by design
-                warehouse = challenge.warehouses[warehouses[warehouse_count]]
-
-                # Loading as many products as possible
-                load = min(total_quantity[product], warehouse.products[product], can_load)
-
-                # Removing the load from the products left to deliver
-                total_quantity[product] -= load
-
-                # Loading the products
-                drone.load(warehouse, product, load, challenge.product_weights, solutions)
-
-                # Removing the warehouse from the list of warehouses which have this product
-                if warehouse.products[product] == 0:
-                    product_warehouses[product].remove(warehouse.id)
+            # The rest of the demand can not be fulfilled
+            if not warehouses:
+                break
 
-                warehouse_count += 1
+            # The drone and the warehouse having the product where it can be the earliest (the drones are empty
+            # between two trips, so any of them has room for the product)
+            trips = [challenge.arriving_drone(w.location) + (w,) for w in warehouses]
+            arrival, drone, warehouse = min(trips, key=lambda trip: trip[0])
 
-            # Fetching all the orders which needs this product
-            orders = list(filter(lambda o: product in o.products.keys() and o.products[product] > 0, challenge.orders))
+            # Every drone is busy until the end of the simulation
+            if arrival >= challenge.deadline:
+                return solutions
 
-            # Sorting the orders depending on their distance with the drone
-            orders = sorted(orders, key=lambda o: Challenge.calculate_distance(o.location, drone.location))
+            capacity = drone.max_payload - drone.current_load
+            loads, deliveries = product_trip(challenge, demand, warehouse, product, capacity)
 
-            # Order iterator
-            order_count = 0
+            for loaded, quantity in loads.items():
+                drone.load(warehouse, loaded, quantity, challenge.product_weights, solutions)
 
-            # While the drone is not empty
-            while drone.products[product] > 0:
-                # Fetching the next order where there is a delivery to do
-                order = challenge.orders[orders[order_count].id]
+            for order, delivered, quantity in deliveries:
+                drone.deliver(order, delivered, quantity, challenge.product_weights, solutions)
 
-                # Taking the needed amount for this specific order
-                deliver = min(drone.products[product], order.products[product])
+    return solutions
 
-                # Delivering the products
-                drone.deliver(order, product, deliver, challenge.product_weights, solutions)
 
-                # Next order to deliver
-                order_count += 1
+def product_trip(challenge: Challenge, demand: 'DemandIndex', warehouse: Warehouse, product: int,
+                 capacity: int) -> tuple[dict[int, int], list[tuple[Order, int, int]]]:
+    """
+        - Plans the trip of a drone from a warehouse for a product: the nearest order needing the product is served
+          first, then the next nearest ones, as long as they are close to the first one (PRODUCT_CLUSTER_RADIUS)
+          and the drone is not full. Each order also gets the other products it needs, from the stock of the
+          warehouse.
+        - The planned amounts are removed from the demand, the orders still needing the product are given back
+        :return:        The amount of each product to load, and the deliveries (order, product, amount) in the
+                        order of the trip
+    """
+    weights = challenge.product_weights
+    loads = {}
+    deliveries = []
+    # Orders taken from the heap, to give back once the trip is planned
+    taken = []
+    first = None
+    first_distance = 0
+
+    while capacity >= weights[product] and warehouse.products[product] > loads.get(product, 0):
+        nearest = demand.nearest(warehouse, product)
+
+        if nearest is None:
+            break
+
+        distance, order = nearest
+        taken.append(nearest)
+
+        if first is None:
+            first, first_distance = order, distance
+        # The next orders are farther from the warehouse, none of them can be close to the first one anymore
+        elif distance > first_distance + PRODUCT_CLUSTER_RADIUS:
+            break
+        elif challenge.distance(first.location, order.location) > PRODUCT_CLUSTER_RADIUS:
+            continue
+
+        # The product of the trip first, then the other products of the order
+        for needed in [product] + [p for p in order.products if p != product]:
+            quantity = min(order.products[needed], warehouse.products[needed] - loads.get(needed, 0),
+                           capacity // weights[needed])
+
+            if quantity > 0:
+                loads[needed] = loads.get(needed, 0) + quantity
+                capacity -= quantity * weights[needed]
+                deliveries.append((order, needed, quantity))
+                demand.deliver(needed, quantity)
+
+    # The orders are delivered after the trip is planned, those fully served are skipped by the heap afterwards
+    planned = {order.id: quantity for order, needed, quantity in deliveries if needed == product}
+    for distance, order in taken:
+        if order.products[product] > planned.get(order.id, 0):
+            demand.push(warehouse, product, distance, order)
+
+    return loads, deliveries
+
+
+def stack_segments(challenge: Challenge, cache: 'SegmentCache' = None) -> ActionBuffer:
+    """
+        Stack segments algorithm (see stack_segments_assignments), with all its actions in one list
+        :return:        The solutions generated by the algorithm
+    """
+    return collect_actions(stack_segments_assignments(challenge, cache))
 
-            # When the drone has finished palling his route for this iteration, next drone
-            last_drone += 1
 
-    return solutions
+def stack_segments_stream(challenge: Challenge,
+                          cache: 'SegmentCache' = None) -> Iterator[tuple[int, int, int, int, int]]:
+    """
+        Stack segments algorithm (see stack_segments_assignments), streaming its actions (see stream_solution)
+        :return:        The packed actions of the solution
+    """
+    return action_rows(stack_segments_assignments(challenge, cache))
 
 
-def stack_segments(challenge: Challenge) -> list[Action]:
+def stack_segments_assignments(challenge: Challenge, cache: 'SegmentCache' = None) -> Iterator[tuple[int, Segment]]:
     """
         Splitting in a smart way the orders among the drones.
         Every order is represented by a "segment", which the most optimised list of actions to unroll in order to
         deliver the order as soon as possible.
-        Then, while there are still orders to process, the first drone which has nothing to do will choose the order
-        which will take the less time to deliver.
+        Then, while there are still orders to process, the order which will take the less time to deliver is given to
+        the drone which can be at its start the earliest.
 
         AT THIS DAY : One of the simplest algorithms, but the best one so far.
 
-        :return:        The solutions generated by the algorithm
-    """
-    solutions = []
+        The cache (of this challenge only) keeps the segments between the runs on the same challenge: the first run
+        fills it, the next ones on an unmodified copy of the challenge reuse every segment.
 
+        :return:        The drone and the segment of each assignment, as soon as the segment is attributed
+    """
     # List of segments
     segments = []
 
-    # Fake drone used for the generation of each segment
-    drone = challenge.drones[0]
+    # Fake drone used for the generation of each segment (the actions are given to the real drones afterwards)
+    drone = Drone(0, challenge.max_payload, challenge.warehouses[0].location, challenge.distance)
 
-    # Generating a segment for each order
+    # Generating a segment for each order (or reusing the one already built for the same stock)
     for order in challenge.orders:
-        # Sorted warehouses depending on their distance from the order
-        warehouses = sorted(
-            challenge.warehouses,
-            key=lambda w: Challenge.calculate_distance(w.location, order.location)
-        )
+        segments.append(order_segment(challenge, order, drone, cache))
 
-        # Gets the actions for this order
-        actions = path_for_order(challenge, warehouses, order, drone)
-
-        # When the order is completed, all its actions are added to the segment
-        segments.append(Segment(challenge.get_location(actions[0]), order.location, challenge, actions, order.id))
-
-    # Logs of every segment accomplished by each drone
-    paths = {drone.id: [] for drone in challenge.drones}
-    # Saving the amount of turns used for each drone
-    # Can be calculated from 'paths', but this dict is here for saving time and memory
-    length_paths = {drone.id: 0 for drone in challenge.drones}
     # Choosing the smallest segments for the first iteration of the drones
     simplest_segments = sorted(segments, key=lambda s: s.turns, reverse=True)
 
     # For each drone
-    for i in range(len(challenge.drones)):
+    for drone in challenge.drones:
         # In case there are more drones than there are orders
         if len(simplest_segments) > 0:
             # Taking the simplest order
             segment = simplest_segments.pop()
             segments.remove(segment)
-            # Adding it to the drone order list
-            paths[i].append(segment)
-            length_paths[i] += segment.turns
+            # Adding it after the last action of the drone
+            drone.follow(segment.start, segment.end, segment.turns)
+            yield drone.id, segment
 
     # Where now need to split the segments among the drones
     while len(segments) > 0:
-        # Selecting the drone which will finish his deliveries the earliest at this point
-        drone_id = min(length_paths, key=length_paths.get)
-
         # Choosing the segment which is the smallest (the one taking the less time for delivery)
         segment = min(segments, key=lambda s: s.turns)
         # Removing the segment from the list
         segments.remove(segment)
-        # Adding the segment to the drone order list
-        paths[drone_id].append(segment)
-        length_paths[drone_id] += segment.turns + Challenge.calculate_distance(segment.start, paths[drone_id][-1].end)
-
-    # When all the segments are attributed to a drone
-    # Adding all the actions to the final list
 
-    for drone_id, segments in paths.items():
-        for segment in segments:
-            for action in segment.actions:
-                # Adding the actions with the real drone ID
-                solutions.append([drone_id, action[1], action[2], action[3], action[4]])
-
-    return solutions
+        # Selecting the drone which can be at the start of the segment the earliest
+        _, drone = challenge.arriving_drone(segment.start)
+        # Adding the segment after the last action of the drone
+        drone.follow(segment.start, segment.end, segment.turns)
+        yield drone.id, segment
 
 
-def split_orders(orders: list[Order], nb_zones: int) -> list[list[Order]]:
+def zone_challenge(challenge: Challenge, zone: list[Order], stock: list[list[int]]) -> Challenge:
     """
-        Splitting in N (nb_zones) lists the given list of orders.
-        Used in the "layers" algorithm.
-        :return:        A list of the lists of split orders
+        - Creates a smaller challenge containing only the orders of a zone, and the stock reserved for it
+        :return:        The challenge of the zone
     """
-    sub_list_length = len(orders) // nb_zones
-    results = []
+    warehouses = [Warehouse(w.id, w.location, list(stock[w.id])) for w in challenge.warehouses]
 
-    # Divide the list in nb_zones lists
-    for i in range(nb_zones):
-        first = i * sub_list_length
-        last = (i + 1) * sub_list_length
+    return Challenge(challenge.rows_count, challenge.columns_count, len(challenge.drones), challenge.deadline,
+                     challenge.max_payload, challenge.product_weights, warehouses, deepcopy(zone))
 
-        # For the last list, just adding the remaining orders
-        if i == nb_zones - 1:
-            last = len(orders)
 
-        results.append(orders[first:last])
-
-    return results
+def shared_zone_solution(shared: 'SharedChallenge', order_ids: list[int], stock: list[list[int]],
+                         config: SolverConfig = DEFAULT_CONFIG) -> ActionBuffer:
+    """
+        - Solves a zone in a worker process, from the challenge published in shared memory
+        :return:        The solution of the zone
+    """
+    try:
+        return workload_repartition(shared.to_challenge(order_ids, stock), config)
+    finally:
+        shared.close()
 
 
-def layers(challenge: Challenge) -> list[Action]:
+def layers(challenge: Challenge, nb_zones: int = None, workers: int = None,
+           config: SolverConfig = DEFAULT_CONFIG) -> ActionBuffer:
     """
-        Algorithm splitting the orders in a certain amount of zones, which are taking cared of one by one, with all
-        the drones. The order of the zones is determined by the score each one of them is creating.
+        Algorithm splitting the orders in a certain amount of zones (clusters of close orders, weighted by their
+        demand), which are taking cared of one by one, with all the drones. The zones with the best estimated score
+        per turn are delivered first.
+        The stock of the warehouses is shared among the zones beforehand, so each zone is solved only once, and the
+        zones are solved in parallel, by at most one worker process per zone and per core (in this process if only
+        one worker would be used, or if 'workers' is 1).
         It is using one of the other algorithms for completing a zone.
+        The amount of zones is taken from the config if not given (and chosen automatically if neither gives it).
         :return:        The solutions generated by the algorithm
     """
-    solutions = []
+    from clustering import cluster_orders, estimate_zone_score, reserve_stock
+
+    solutions = ActionBuffer()
+
+    if nb_zones is None:
+        nb_zones = config.nb_zones
+
+    # Splitting the orders (the amount of zones is chosen automatically if not given)
+    zones = cluster_orders(challenge, nb_zones)
+
+    # Sorting the zones depending on the score per turn they are estimated to return (as good as solving the zones
+    # first to order them by their real score per turn, see the README)
+    zones = sorted(zones, key=lambda z: estimate_zone_score(challenge, z), reverse=True)
+
+    # Each zone only uses the stock it will need, in the order of the zones
+    reservations = reserve_stock(challenge, zones)
+
+    # More processes than zones or than cores would only wait for each other (a single one is slower than this
+    # process, which does not have to start it nor to read the challenge from shared memory)
+    workers = min(len(zones), workers or os.cpu_count() or 1)
+
+    # Solving the zones in parallel, the results being kept in the order of the zones
+    if workers <= 1:
+        zone_challenges = [zone_challenge(challenge, zone, stock) for zone, stock in zip(zones, reservations)]
+        zone_solutions = [workload_repartition(c, config) for c in zone_challenges]
+    else:
+        from utils.SharedChallenge import SharedChallenge
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+        # The workers read the challenge from shared memory, only the orders and the stock of each zone are sent
+        try:
+            with SharedChallenge.publish(challenge) as shared:
+                zone_solutions = list(executor.map(
+                    partial(shared_zone_solution, shared, config=config),
+                    [[order.id for order in zone] for zone in zones],
+                    reservations
+                ))
+        finally:
+            # When interrupted (time limit of anytime_solve, SIGINT, SIGTERM), the zones not started yet are
+            # cancelled, and only the ones being solved are waited for
+            executor.shutdown(cancel_futures=True)
+
+    # The drones are doing the zones one after the other
+    for local_solutions in zone_solutions:
+        solutions.extend(local_solutions)
 
-    NB_ZONES = 3
+    return solutions
 
-    # Sorting the orders depending on their distances from the center of the board
-    sorted_orders = sorted(
-        challenge.orders,
-        key=lambda o: Challenge.calculate_distance(
-            o.location,
-            (challenge.rows_count // 2, challenge.columns_count // 2)
-        )
-    )
 
-    # Splitting the orders
-    order_zones = split_orders(sorted_orders, NB_ZONES)
-    # Saving the challenge for later (the algorithm will empty the orders)
-    future_order_zones = deepcopy(order_zones)
-
-    zones_scores = []
-
-    # For each zone
-    for i, zone in enumerate(order_zones):
-        # Saving a new instance of the challenge, so it won't be emptied for the next zones
-        new_challenge = deepcopy(challenge)
-        new_challenge.orders = zone
-        # Also saving another instance of challenge for the scoring part
-        score_challenge = deepcopy(new_challenge)
-        # Associating the score of the zone with its id
-        zones_scores.append((i, score_solution(workload_repartition(new_challenge), score_challenge)))
-
-    # Sorting the zones depending on the score they are each returning
-    sorted_zones_scores = sorted(zones_scores, key=lambda x: x[1], reverse=True)
-
-    # Running the algorithm one more time with all the sorted zones together
-    for zone_id, score in sorted_zones_scores:
-        challenge.orders = future_order_zones[zone_id]
-        local_solutions = workload_repartition(challenge)
-        for solution in local_solutions:
-            solutions.append(solution)
+def workload_repartition(challenge: Challenge, config: SolverConfig = DEFAULT_CONFIG) -> ActionBuffer:
+    """
+        Workload repartition algorithm (see workload_repartition_assignments), with all its actions in one list
+        :return:        The solutions generated by the algorithm
+    """
+    return collect_actions(workload_repartition_assignments(challenge, config))
 
-    return solutions
 
+def workload_repartition_stream(challenge: Challenge,
+                                config: SolverConfig = DEFAULT_CONFIG) -> Iterator[tuple[int, int, int, int, int]]:
+    """
+        Workload repartition algorithm (see workload_repartition_assignments), streaming its actions (see
+        stream_solution)
+        :return:        The packed actions of the solution
+    """
+    return action_rows(workload_repartition_assignments(challenge, config))
 
-def workload_repartition(challenge: Challenge) -> list[Action]:
+
+def workload_repartition_assignments(challenge: Challenge,
+                                     config: SolverConfig = DEFAULT_CONFIG) -> Iterator[tuple[int, Segment]]:
     """
         A new version of the stack segments algorithm. Here, it is not one segment per order, but one segment per
         delivery operation (one warehouse and one order to deliver). All these small operations are dispatched among
         the drones equally. A segment may go to multiple warehouses if they are not too far away.
-        :return:        The solutions generated by the algorithm
+        The constants of the algorithm are taken from the config.
+        :return:        The drone and the segment of each assignment, as soon as the segment is attributed
     """
-    solutions = []
-
     # Used to see if going to more warehouses is a big detour
-    LONGER_THAN_ORDER_RATIO = 3
+    longer_than_order_ratio = config.longer_than_order_ratio
     # Percentage of the importance of "percentage of completion" against "length of the segment" while trying to choose
     # a new segment to complete
-    RATIO_ORDER_COMPLETION = 0.76
+    ratio_order_completion = config.ratio_order_completion
 
-    # List of segments
+    # List of segments, and amount of units of products delivered by each segment
     segments = []
+    segment_units = []
 
     # Fetches an order from its ID
     orders_by_id = {order.id: i for i, order in enumerate(challenge.orders)}
@@ -459,7 +550,7 @@ def workload_repartition(challenge: Challenge) -> list[Action]:
         # Sorting the warehouses depending on their distance with the order
         warehouses = sorted(
             challenge.warehouses,
-            key=lambda w: Challenge.calculate_distance(w.location, order.location)
+            key=lambda w: challenge.distance(w.location, order.location)
         )
 
         # Warehouse iterator
@@ -490,7 +581,7 @@ def workload_repartition(challenge: Challenge) -> list[Action]:
                         workload[warehouse][product] = load
 
                     # Updating the amount of products to find for the order
-                    products_remaining[product] -= load
+                    order.receive(product, load)
 
             # Next warehouse
             warehouse_count += 1
@@ -498,7 +589,7 @@ def workload_repartition(challenge: Challenge) -> list[Action]:
         # While there are things to load in the drones for the order
         while not all(all(q == 0 for q in w.values()) for w in workload.values()):
             # Listing the actions for a specific segment
-            actions = []
+            actions = ActionBuffer()
 
             # Remaining load in the drone
             remaining_load = challenge.max_payload
@@ -516,13 +607,13 @@ def workload_repartition(challenge: Challenge) -> list[Action]:
                     # Calculating the distances between
                     # The warehouse where the drone may go and the order (a longer path than the one he is currently
                     # using from the last warehouse he visited)
-                    d_warehouse = Challenge.calculate_distance(challenge.get_location(actions[-1]), warehouse.location)
-                    d_warehouse_to_order = Challenge.calculate_distance(order.location, warehouse.location)
+                    d_warehouse = challenge.distance(challenge.get_location(actions[-1]), warehouse.location)
+                    d_warehouse_to_order = challenge.distance(order.location, warehouse.location)
                     # And between its last warehouse and the order (the current planned path)
-                    d_order_current = Challenge.calculate_distance(challenge.get_location(actions[-1]), order.location)
+                    d_order_current = challenge.distance(challenge.get_location(actions[-1]), order.location)
 
                     # If doing a detour at this new warehouse is less than RATIO times longer than the current path
-                    if d_warehouse + d_warehouse_to_order <= d_order_current * LONGER_THAN_ORDER_RATIO:
+                    if d_warehouse + d_warehouse_to_order <= d_order_current * longer_than_order_ratio:
                         # Then the drone may visit the warehouse
                         visit_warehouse = True
 
@@ -546,11 +637,11 @@ def workload_repartition(challenge: Challenge) -> list[Action]:
 
                         # Adding the action to the actions of this segment
                         # False drone ID, which will be changed at the end
-                        actions.append([99999, 'L', warehouse.id, product, load])
+                        actions.add(99999, LOAD, warehouse.id, product, load)
                         # Removing the products from the needed workload
                         workload[warehouse][product] -= load
                         # Removing the products from the warehouse
-                        warehouse.products[product] -= load
+                        warehouse.remove(product, load)
                         # Updating the remaining space in the drone
                         remaining_load -= challenge.product_weights[product] * load
 
@@ -559,113 +650,152 @@ def workload_repartition(challenge: Challenge) -> list[Action]:
             # Grouping together the products for a faster delivery
             product_list = {}
 
-            for action in actions:
-                product_list[action[3]] = product_list.get(action[3], 0) + action[4]
+            for _, _, _, product, quantity in actions.rows():
+                product_list[product] = product_list.get(product, 0) + quantity
 
             # Adding the delivery actions
             for product, quantity in product_list.items():
-                actions.append([99999, 'D', order.id, product, quantity])
+                actions.add(99999, DELIVER, order.id, product, quantity)
 
             # When the delivery is completed, a new segment is created with the given actions
             segments.append(Segment(challenge.get_location(actions[0]), order.location, challenge, actions, order.id))
+            segment_units.append(sum(product_list.values()))
+
+    # Counters of each order, updated every time one of its segments is attributed
+    # Segments not attributed yet (used to get the easiest orders to complete)
+    segments_remaining = {order_id: 0 for order_id in orders_by_id.keys()}
+    # Units of products attributed to the drones, and completion percentage (from 0 to 100)
+    units_delivered = {order_id: 0 for order_id in orders_by_id.keys()}
+    order_completion = {order_id: 0 for order_id in orders_by_id.keys()}
+    # Segments of each order not attributed yet
+    order_segments = {order_id: [] for order_id in orders_by_id.keys()}
+
+    for count, segment in enumerate(segments):
+        segments_remaining[segment.order_id] += 1
+        order_segments[segment.order_id].append(count)
+
+    def attribute(count: int) -> None:
+        """
+            - Updates the counters of the order of an attributed segment
+        """
+        order_id = segments[count].order_id
+        order = challenge.orders[orders_by_id[order_id]]
+
+        segments_remaining[order_id] -= 1
+        units_delivered[order_id] += segment_units[count]
+        order_completion[order_id] = units_delivered[order_id] / order.initial_amount * 100
+        order_segments[order_id].remove(count)
+
+    # Choosing the easiest segments for starting the drones (the ones of the orders with the fewest segments)
+    simplest_segments = sorted(range(len(segments)), key=lambda c: segments_remaining[segments[c].order_id])
+    first_segments = simplest_segments[:len(challenge.drones)]
+
+    # For each drone (fewer segments than drones leaves some drones without segments)
+    for drone, count in zip(challenge.drones, first_segments):
+        attribute(count)
+        # Adding it after the last action of the drone
+        drone.follow(segments[count].start, segments[count].end, segments[count].turns)
+        yield drone.id, segments[count]
+
+    remaining = simplest_segments[len(first_segments):]
+
+    if len(remaining) == 0:
+        return
 
-    # Logs of every segment accomplished by each drone
-    paths = {drone.id: [] for drone in challenge.drones}
-    # Saving the amount of turns used for each drone
-    # Can be calculated from 'paths', but this dict is here for saving time and memory
-    length_paths = {drone.id: 0 for drone in challenge.drones}
+    # Longest segment + the longest possible travel distance (used for comparing the length of the segments)
+    longest_time = (
+            max(segments[count].turns for count in remaining) +
+            sqrt(challenge.rows_count ** 2 + challenge.columns_count ** 2)
+    )
 
-    # Counting the amount of segments per order (used to get the easiest orders to complete)
-    segments_per_orders = {
-        order_id: len(list(filter(lambda s: s.order_id == id, segments))) for order_id in orders_by_id.keys()
-    }
+    def fixed_coefficient(count: int) -> float:
+        """
+            - Part of the coefficient of a segment which does not depend on the drone: the completion of its order
+              (the more complete, the sooner the segment should be done) and its own length
+        """
+        segment = segments[count]
+        return (
+                ratio_order_completion * (100 - order_completion[segment.order_id]) +
+                (1 - ratio_order_completion) * (segment.turns / longest_time) * 100
+        )
 
-    # Choosing the easiest segments for starting the drones
-    simplest_segments = sorted(segments, key=lambda s: segments_per_orders[s.order_id], reverse=True)
+    # Segments not attributed yet, by their fixed coefficient
+    from utils.KeyedHeap import KeyedHeap
 
-    # For each drone
-    for i in range(len(challenge.drones)):
-        # Security in case there are fewer orders than drones
-        if len(simplest_segments) > 0:
-            # Removing the last (easiest) segment from the list
-            segment = simplest_segments.pop()
-            segments.remove(segment)
-            # Adding it to the logs of the drones
-            paths[i].append(segment)
-            length_paths[i] += segment.turns
+    heap = KeyedHeap()
+    for count in sorted(remaining):
+        heap.push(count, fixed_coefficient(count))
 
-    # Longest segment + the longest possible travel distance (used for comparing the length of the segments)
-    if len(segments) > 0:
-        longest_time = (
-                sorted(segments, key=lambda s: s.turns)[-1].turns +
-                sqrt(challenge.rows_count ** 2 + challenge.columns_count ** 2)
-        )
+    # Where now need to split the segments among the drones
+    while len(heap) > 0:
+        # Selecting the drone which will finish his deliveries the earliest at this point
+        drone = challenge.earliest_drone()
+        position = drone.location
 
-        # Where now need to split the segments among the drones
-        while len(segments) > 0:
-            # Selecting the drone which will finish his deliveries the earliest at this point
-            drone_id = min(length_paths, key=length_paths.get)
-
-            # Choosing the next segment depending on two factors
-            # If the segment is in an order which will finish soon (high percentage of completion)
-            # If the drone will take a lot of time to realise the segment
-            # Scoring from 0 to 100
-            # ID of the segment, score
-            next_segment = (-1, 100)
-
-            # For each segment
-            for count, segment in enumerate(segments):
-                # Fetching the linked order
-                order = challenge.orders[orders_by_id[segment.order_id]]
-                # Completion percentage
-                order_completion = ((order.initial_amount - sum(order.products)) / order.initial_amount) * 100
-                time_spent = segment.turns + Challenge.calculate_distance(segment.start, paths[drone_id][-1].end)
-                # Percentage of maximal time used
-                time_proportion = (time_spent / longest_time) * 100
-                coefficient = RATIO_ORDER_COMPLETION * order_completion + (1 - RATIO_ORDER_COMPLETION) * time_proportion
-
-                # Choosing the best segment depending on the coefficient
-                if coefficient < next_segment[1]:
-                    next_segment = (count, coefficient)
-
-            # Fetching the best segment
-            segment = segments[next_segment[0]]
-            # Removing it from the segment list
-            segments.remove(segment)
-            # Adding the segment to the drone logs
-            paths[drone_id].append(segment)
-            length_paths[drone_id] += (
-                    segment.turns +
-                    Challenge.calculate_distance(segment.start, paths[drone_id][-1].end)
-            )
-
-    # When all the segments are attributed to a drone
-    # Adding all the actions to the final list
-
-    for drone_id, segments in paths.items():
-        for segment in segments:
-            for action in segment.actions:
-                # Adding the action with the real drone ID
-                solutions.append([drone_id, action[1], action[2], action[3], action[4]])
+        # Choosing the next segment depending on two factors (the smallest coefficient)
+        # If the segment is in an order which will finish soon (high percentage of completion)
+        # If the drone will take a lot of time to realise the segment (its length, and the travel to its start)
+        # Scoring from 0 to 100
+        # ID of the segment, coefficient
+        next_segment = (-1, float('inf'))
 
-    return solutions
+        # The travel only adds to the fixed coefficient, so the segments are taken by fixed coefficient until it is
+        # higher than the best coefficient found (the other ones are put back)
+        candidates = []
+
+        while len(heap) > 0 and heap.peek()[1] < next_segment[1]:
+            count, fixed = heap.pop()
+            candidates.append((count, fixed))
+
+            travel = challenge.distance(segments[count].start, position)
+            coefficient = fixed + (1 - ratio_order_completion) * (travel / longest_time) * 100
+
+            # Choosing the best segment depending on the coefficient
+            if coefficient < next_segment[1]:
+                next_segment = (count, coefficient)
+
+        # Fetching the best segment, the segments to attribute being all the other ones
+        count = next_segment[0]
+        segment = segments[count]
+        for other, fixed in candidates:
+            if other != count:
+                heap.push(other, fixed)
+        attribute(count)
+
+        # The other segments of the order are now closer to its completion
+        for other in order_segments[segment.order_id]:
+            heap.push(other, fixed_coefficient(other))
+
+        # The segment is given to the drone which can be at its start the earliest
+        _, drone = challenge.arriving_drone(segment.start)
+
+        # Adding the segment after the last action of the drone
+        drone.follow(segment.start, segment.end, segment.turns)
+        yield drone.id, segment
 
 
-def solve(challenge):
-    # Listing all the algorithms
+def solve(challenge, config: SolverConfig = DEFAULT_CONFIG, tuned: str = None):
+    # Listing all the algorithms (the config is used by workload_repartition and layers)
     # As 'stack segment' is for now the best algorithm, the other ones are commented for speed concerns
+    # The algorithm a tuned config was made for ('tuned', see tuner.py) is compared with it, so the best score is kept
+    from scoring import fast_score_solution
+    from strategies import run_strategy
+
     solvers = {
         # 'naive': naive(deepcopy(challenge)),
         'stack_segments': stack_segments(deepcopy(challenge)),
         # 'product_by_product': product_by_product(deepcopy(challenge)),
-        # 'workload_repartition': workload_repartition(deepcopy(challenge)),
-        # 'layers_workload_repartition': layers(deepcopy(challenge))
+        # 'workload_repartition': workload_repartition(deepcopy(challenge), config),
+        # 'layers_workload_repartition': layers(deepcopy(challenge), config=config)
     }
 
+    if tuned is not None and tuned not in solvers:
+        solvers[tuned] = run_strategy(tuned, deepcopy(challenge), config)
+
     solutions = {}
 
     for algo, solution in solvers.items():
-        solutions[algo] = score_solution(solvers[algo], deepcopy(challenge))
+        solutions[algo] = fast_score_solution(solvers[algo], challenge)
         print(f'Solution \'{algo}\' : {solutions[algo]}')
 
     best_solution = max(solutions.keys(), key=lambda a: solutions[a])
@@ -673,3 +803,100 @@ def solve(challenge):
     print('The best solution is :', best_solution)
 
     return solvers[best_solution]
+
+
+class SolveInterrupted(Exception):
+    """
+        Raised when the anytime solve has to stop (time limit reached, SIGINT or SIGTERM)
+    """
+
+
+def _interrupt(signal_number, frame):
+    """
+        Signal handler stopping the anytime solve
+    """
+    raise SolveInterrupted(signal.Signals(signal_number).name)
+
+
+def anytime_solve(challenge: Challenge, output: str | None, time_limit: float = None,
+                  checkpoint_every: float = 0, config: SolverConfig = DEFAULT_CONFIG,
+                  cache: 'SegmentCache' = None, workers: int = None) -> ActionBuffer:
+    """
+        Anytime version of solve. The fast 'stack segments' solution is saved first, then the other algorithms
+        (and other settings of the layers algorithm) are tried one by one, and the output file is overwritten every
+        time a better solution is found.
+        The search stops when every algorithm has been tried, when the time limit (in seconds) is reached, or on
+        SIGINT / SIGTERM. In every case, the best solution found so far is on disk.
+        With checkpoint_every (in seconds), the improvements are written at most once per period (the last one is
+        always written before returning).
+        The config is used by workload_repartition and layers. Without output file, nothing is saved.
+        Only stack_segments builds the segments of the orders (see order_segment), once per search: a segment cache
+        of this challenge (kept between the searches, like in the server) lets the next searches reuse them.
+        The amount of worker processes of layers is given by 'workers' (1 to solve its zones in this process, which
+        is needed when the search already runs in a worker process).
+        :return:        The best solution found
+    """
+    from scoring import fast_score_solution
+
+    start = time.monotonic()
+
+    # Algorithms in the order they are tried: the fastest first, then the most promising ones
+    solvers = [
+        ('stack_segments', partial(stack_segments, cache=cache)),
+        ('layers_workload_repartition', partial(layers, workers=workers, config=config)),
+        ('workload_repartition', partial(workload_repartition, config=config)),
+        ('naive', naive),
+        ('product_by_product', product_by_product),
+    ]
+    solvers += [(f'layers_{nb_zones}_zones', partial(layers, nb_zones=nb_zones, workers=workers, config=config))
+                for nb_zones in range(2, 9)]
+
+    best_solution, best_score, best_algo = None, None, None
+    last_checkpoint = None
+    saved = True
+
+    # Stopping on SIGINT / SIGTERM, and on the time limit (signals can only be handled by the main thread)
+    handle_signals = threading.current_thread() is threading.main_thread()
+    previous_handlers = {}
+
+    if handle_signals:
+        for signal_number in (signal.SIGINT, signal.SIGTERM, signal.SIGALRM):
+            previous_handlers[signal_number] = signal.signal(signal_number, _interrupt)
+        if time_limit is not None:
+            signal.setitimer(signal.ITIMER_REAL, max(time_limit, 0.001))
+
+    try:
+        for algo, solver in solvers:
+            if time_limit is not None and time.monotonic() - start >= time_limit:
+                break
+
+            solution = solver(deepcopy(challenge))
+            score = fast_score_solution(solution, challenge, 'auto')
+            print(f'Solution \'{algo}\' : {score}')
+
+            if best_score is None or score > best_score:
+                best_solution, best_score, best_algo = solution, score, algo
+                saved = False
+
+            # The first solution is always saved right away
+            now = time.monotonic()
+            if not saved and output is not None and \
+                    (last_checkpoint is None or now - last_checkpoint >= checkpoint_every):
+                save_solution(output, best_solution)
+                last_checkpoint, saved = now, True
+
+    except SolveInterrupted as reason:
+        print(f'Interrupted ({reason}), keeping the best solution so far')
+
+    finally:
+        if handle_signals:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            for signal_number, handler in previous_handlers.items():
+                signal.signal(signal_number, handler)
+
+        if not saved and output is not None:
+            save_solution(output, best_solution)
+
+    print('The best solution is :', best_algo)
+
+    return best_solution
@@ -0,0 +1,95 @@
+"""
+@title : Strategies
+@description : Registry of the algorithms, which are only imported when they are used
+"""
+
+from utils.SolverConfig import SolverConfig, DEFAULT_CONFIG
+from typing import Callable, Iterator
+import importlib
+
+# Name of each algorithm -> module, function, if the function takes the config of the algorithms, and the function
+# streaming its actions (see solver.stream_solution), if it has one
+REGISTRY = {
+    'naive': ('solver', 'naive', False, None),
+    'product_by_product': ('solver', 'product_by_product', False, None),
+    'stack_segments': ('solver', 'stack_segments', False, 'stack_segments_stream'),
+    'workload_repartition': ('solver', 'workload_repartition', True, 'workload_repartition_stream'),
+    'layers': ('solver', 'layers', True, None),
+}
+
+
+def register_strategy(name: str, module: str, function: str, configurable: bool = False, stream: str = None) -> None:
+    """
+        - Adds an algorithm to the registry, without importing it
+    """
+    REGISTRY[name] = (module, function, configurable, stream)
+
+
+def strategy_names() -> list[str]:
+    """
+        - Lists the registered algorithms
+        :return:        The names of the algorithms
+    """
+    return list(REGISTRY.keys())
+
+
+def is_configurable(name: str) -> bool:
+    """
+        - Checks if an algorithm uses the config of the algorithms (SolverConfig)
+        :return:        True if the algorithm takes the config
+    """
+    return REGISTRY[name][2]
+
+
+def has_stream(name: str) -> bool:
+    """
+        - Checks if an algorithm can stream its actions instead of returning the whole solution
+        :return:        True if the algorithm has a stream function
+    """
+    return REGISTRY[name][3] is not None
+
+
+def get_strategy(name: str) -> Callable:
+    """
+        - Imports an algorithm (its module is only imported the first time)
+        :return:        The function of the algorithm
+    """
+    if name not in REGISTRY:
+        raise KeyError(f'Unknown strategy \'{name}\' (expected one of {", ".join(REGISTRY)})')
+
+    module, function, _, _ = REGISTRY[name]
+
+    return getattr(importlib.import_module(module), function)
+
+
+def run_strategy(name: str, challenge, config: SolverConfig = DEFAULT_CONFIG, **options):
+    """
+        - Runs an algorithm on a challenge (modifying it), giving it the config if it takes one, and the other
+          options of the algorithm (workers of layers, ...)
+        :return:        The solution of the algorithm
+    """
+    strategy = get_strategy(name)
+
+    if is_configurable(name):
+        return strategy(challenge, config=config, **options)
+
+    return strategy(challenge, **options)
+
+
+def stream_strategy(name: str, challenge, config: SolverConfig = DEFAULT_CONFIG, **options) -> Iterator[tuple]:
+    """
+        - Runs an algorithm which can stream its actions (see has_stream), the challenge being modified as the
+          actions are produced
+        :return:        The packed actions of the solution (drone, opcode, target, product, quantity)
+    """
+    module, _, configurable, stream = REGISTRY[name]
+
+    if stream is None:
+        raise KeyError(f'The strategy \'{name}\' can not stream its actions')
+
+    strategy = getattr(importlib.import_module(module), stream)
+
+    if configurable:
+        return strategy(challenge, config=config, **options)
+
+    return strategy(challenge, **options)
@@ -0,0 +1,288 @@
+"""
+@title : Tuner
+@description : Searches the best constants of the algorithms for each dataset, and saves them in a profile file
+"""
+
+from parser import parse_challenge
+from scoring import fast_score_solution
+from strategies import strategy_names, is_configurable, run_strategy
+from utils.SolverConfig import SolverConfig
+from utils.SharedChallenge import SharedChallenge
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from math import ceil
+import hashlib
+import glob
+import json
+import os
+import random
+
+# Ranges of the tuned constants
+LONGER_THAN_ORDER_RATIO_RANGE = (1.0, 6.0)
+RATIO_ORDER_COMPLETION_RANGE = (0.0, 1.0)
+NB_ZONES_CHOICES = [None, 1, 2, 3, 4, 5, 6, 8]
+
+# Algorithms taking the constants, which can be tuned (the profile is tuned for one of them)
+TUNED_STRATEGIES = [name for name in strategy_names() if is_configurable(name)]
+
+# Source files of the algorithms: the cached scores are only reused while they have not changed
+SOLVER_SOURCES = ['solver.py', 'clustering.py', 'scoring.py', 'utils/*.py']
+
+# Challenges already read from shared memory by a worker process
+_challenges = {}
+
+
+def file_hash(filename: str) -> str:
+    """
+        - Hash of the content of a file, so the cache is invalidated if a challenge changes
+        :return:        The hexadecimal SHA-1 of the file
+    """
+    with open(filename, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def solver_hash() -> str:
+    """
+        - Hash of the source of the algorithms, so the cache is invalidated when they change
+        :return:        The hexadecimal SHA-1 of the source files
+    """
+    digest = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    for pattern in SOLVER_SOURCES:
+        for filename in sorted(glob.glob(os.path.join(directory, pattern))):
+            digest.update(os.path.relpath(filename, directory).encode())
+            with open(filename, 'rb') as f:
+                digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def random_config(rng: random.Random, strategy: str) -> SolverConfig:
+    """
+        - Draws a random config in the tuned ranges (the amount of zones is only drawn for layers, the only
+          algorithm using it)
+        :return:        The config
+    """
+    return SolverConfig(
+        longer_than_order_ratio=round(rng.uniform(*LONGER_THAN_ORDER_RATIO_RANGE), 3),
+        ratio_order_completion=round(rng.uniform(*RATIO_ORDER_COMPLETION_RANGE), 3),
+        nb_zones=rng.choice(NB_ZONES_CHOICES) if strategy == 'layers' else None,
+    )
+
+
+def evaluate(task: tuple[SharedChallenge, str, dict]) -> int:
+    """
+        - Scores an algorithm with a config on a challenge
+        - Runs in a worker process, which reads the challenge from shared memory only once
+        :return:        The score
+    """
+    shared, strategy, values = task
+
+    # The challenge reads its distance matrix from the shared block, which stays open as long as the worker
+    if shared.name not in _challenges:
+        _challenges[shared.name] = shared.to_challenge()
+    challenge = _challenges[shared.name]
+
+    # The tuning already runs in parallel processes, the zones of layers are solved one by one
+    options = {'workers': 1} if strategy == 'layers' else {}
+    solution = run_strategy(strategy, deepcopy(challenge), SolverConfig.from_dict(values), **options)
+
+    # Scored thousands of times: the compiled or vectorized backend is worth its import
+    return fast_score_solution(solution, challenge, 'auto')
+
+
+class TuningCache:
+    """
+        Scores already evaluated, stored on disk as JSON ({challenge hash: {algorithm and config key: score}}),
+        so an interrupted or repeated tuning does not evaluate the same configs again.
+        The challenge hash also contains the hash of the algorithms (see solver_hash), so the scores of an older
+        version of the algorithms are never reused.
+
+        Class is defined by:
+            - filename
+            - scores
+    """
+
+    """ Constructor """
+
+    def __init__(self, filename: str = None):
+        self.filename = filename
+        self.scores = {}
+
+        if filename is not None and os.path.exists(filename):
+            with open(filename, 'r') as f:
+                self.scores = json.load(f)
+
+    def get(self, challenge_hash: str, strategy: str, config: SolverConfig) -> int | None:
+        """
+            - Fetches the score of an algorithm with a config on a challenge
+            :return:        The score, or None if it has not been evaluated yet
+        """
+        return self.scores.get(challenge_hash, {}).get(f'{strategy} {config.key()}')
+
+    def put(self, challenge_hash: str, strategy: str, config: SolverConfig, score: int) -> None:
+        """
+            - Stores the score of an algorithm with a config on a challenge
+        """
+        self.scores.setdefault(challenge_hash, {})[f'{strategy} {config.key()}'] = score
+
+    def save(self) -> None:
+        """
+            - Writes the cache on disk (through a temporary file, so it is never left half written)
+        """
+        if self.filename is None:
+            return
+
+        with open(f'{self.filename}.tmp', 'w') as f:
+            json.dump(self.scores, f)
+
+        os.replace(f'{self.filename}.tmp', self.filename)
+
+
+def evaluate_all(pairs: list[tuple[str, SolverConfig]], strategy: str, hashes: dict[str, str],
+                 shared: dict[str, SharedChallenge], cache: TuningCache, workers: int) -> None:
+    """
+        - Evaluates the algorithm on every (challenge, config) pair which is not in the cache yet, in parallel
+        - The workers are only sent the name of the challenges in shared memory
+    """
+    pending = [(filename, config) for filename, config in pairs
+               if cache.get(hashes[filename], strategy, config) is None]
+
+    # Removing the duplicates
+    pending = list({(filename, config.key()): (filename, config) for filename, config in pending}.values())
+
+    if len(pending) == 0:
+        return
+
+    tasks = [(shared[filename], strategy, config.to_dict()) for filename, config in pending]
+
+    if workers == 1:
+        scores = map(evaluate, tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        scores = executor.map(evaluate, tasks)
+
+    try:
+        for (filename, config), score in zip(pending, scores):
+            cache.put(hashes[filename], strategy, config, score)
+            print(f'{os.path.basename(filename)} {config} : {score}')
+    finally:
+        if workers != 1:
+            executor.shutdown()
+        cache.save()
+
+
+def tune(filenames: list[str], trials: int = 20, seed: int = 0, method: str = 'halving', eta: int = 3,
+         workers: int = None, cache: TuningCache = None, strategy: str = 'layers') -> dict[str, SolverConfig]:
+    """
+        Searches the best config of an algorithm (the one the profile is used with) for each challenge.
+        - 'random': every random config (plus the default one) is evaluated on every challenge
+        - 'halving': successive halving, the challenges being the budget. All the configs are evaluated on the
+          cheapest challenge, then only the best 1 / eta of them go on with one more challenge, and so on
+          (the configs are ranked by their mean score relative to the best score of each challenge)
+        :return:        The best config of each challenge, and the best config overall as 'default'
+    """
+    cache = cache or TuningCache()
+    workers = workers or os.cpu_count()
+    rng = random.Random(seed)
+
+    # The scores depend on the challenge and on the version of the algorithms
+    version = solver_hash()
+    hashes = {filename: f'{file_hash(filename)}-{version}' for filename in filenames}
+    # The cheapest challenges first (smallest files)
+    filenames = sorted(filenames, key=os.path.getsize)
+
+    if strategy not in TUNED_STRATEGIES:
+        raise ValueError(f'The strategy \'{strategy}\' has no constants to tune')
+
+    configs = [SolverConfig()] + [random_config(rng, strategy) for _ in range(trials)]
+
+    def relative_score(config: SolverConfig, challenges: list[str]) -> float:
+        """
+            - Mean score of a config, relative to the best score of each challenge
+        """
+        total = 0
+        for filename in challenges:
+            best = max(cache.get(hashes[filename], strategy, c) or 0 for c in configs)
+            total += (cache.get(hashes[filename], strategy, config) or 0) / best if best > 0 else 0
+        return total / len(challenges)
+
+    if method not in {'random', 'halving'}:
+        raise ValueError(f'Unknown tuning method \'{method}\'')
+
+    # Every challenge is parsed once, and read by the workers from shared memory
+    shared = {}
+
+    try:
+        for filename in filenames:
+            shared[filename] = SharedChallenge.publish(parse_challenge(filename))
+
+        if method == 'random':
+            evaluate_all([(f, c) for f in filenames for c in configs], strategy, hashes, shared, cache, workers)
+            survivors = configs
+        else:
+            survivors = configs
+            for rung in range(len(filenames)):
+                challenges = filenames[:rung + 1]
+                evaluate_all([(f, c) for f in challenges for c in survivors], strategy, hashes, shared, cache,
+                             workers)
+
+                # Keeping the best configs for the next challenge
+                if rung < len(filenames) - 1:
+                    survivors = sorted(survivors, key=lambda c: relative_score(c, challenges), reverse=True)
+                    survivors = survivors[:max(1, ceil(len(survivors) / eta))]
+    finally:
+        for challenge in shared.values():
+            challenge.unlink()
+            challenge.close()
+
+    # Best config of each challenge, among the ones evaluated on it
+    profile = {}
+    for filename in filenames:
+        evaluated = [c for c in configs if cache.get(hashes[filename], strategy, c) is not None]
+        profile[os.path.basename(filename)] = max(evaluated, key=lambda c: cache.get(hashes[filename], strategy, c))
+
+    # Best config on all the challenges, for the other datasets
+    profile['default'] = max(survivors, key=lambda c: relative_score(c, filenames))
+
+    return profile
+
+
+def main(arguments: list[str] = None) -> None:
+    """
+        Command line of the tuner (python main.py tune ...)
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='main.py tune', description='Tune the constants of the algorithms.')
+    parser.add_argument('challenges', type=str, nargs='+',
+                        help='challenge definition filenames (training set)')
+    parser.add_argument('--trials', type=int, default=20,
+                        help='amount of random configs to try')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random configs')
+    parser.add_argument('--strategy', choices=TUNED_STRATEGIES, default='layers',
+                        help='algorithm scoring the configs (the one to run with the profile)')
+    parser.add_argument('--method', choices=['halving', 'random'], default='halving',
+                        help='search method')
+    parser.add_argument('--eta', type=int, default=3,
+                        help='successive halving: only 1 / eta of the configs go on to the next challenge')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='amount of parallel processes (all the cores by default)')
+    parser.add_argument('--cache', type=str, default='.tuning_cache.json',
+                        help='file storing the scores already evaluated')
+    parser.add_argument('--profile', type=str, default='profile.json',
+                        help='output profile file, to load with main.py --profile')
+    args = parser.parse_args(arguments)
+
+    profile = tune(args.challenges, args.trials, args.seed, args.method, args.eta, args.workers,
+                   TuningCache(args.cache), args.strategy)
+
+    # Every config is saved with the algorithm it was tuned for
+    with open(args.profile, 'w') as f:
+        json.dump({name: dict(config.to_dict(), strategy=args.strategy) for name, config in profile.items()}, f,
+                  indent=4)
+
+    for name, config in profile.items():
+        print(f'{name} : {config}')
+    print(f'Profile ({args.strategy}) saved in {args.profile}')
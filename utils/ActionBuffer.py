@@ -0,0 +1,225 @@
+"""
+@title : Action Buffer
+@description : Class storing a list of actions in a packed array of integers
+"""
+
+from utils.types import Action
+from array import array
+from typing import Iterable, Iterator
+
+# Opcodes of the commands, stored instead of the letters
+LOAD = 0
+UNLOAD = 1
+DELIVER = 2
+WAIT = 3
+
+# Letter of each command, indexed by opcode
+COMMANDS = 'LUDW'
+OPCODES = {command: opcode for opcode, command in enumerate(COMMANDS)}
+
+# Amount of integers stored for one action (drone, opcode, warehouse / order / turns, product, quantity)
+FIELDS = 5
+
+
+def format_action(drone_id: int, opcode: int, target: int, product: int, quantity: int) -> str:
+    """
+        - Formats a packed action as a line of the output file
+        :return:        The line, without the line break
+    """
+    if opcode == WAIT:
+        return f'{drone_id} W {target} '
+
+    return f'{drone_id} {COMMANDS[opcode]} {target} {product} {quantity} '
+
+
+class ActionBuffer:
+    """
+        An action buffer stores the actions of a solution in a flat array of integers, 5 integers per action
+        ([drone, opcode, target, product, quantity], a wait action using [drone, opcode, turns, 0, 0]).
+        It can be used as a list of actions by the existing code (append, len, iteration and indexing all use
+        the [drone, 'L', warehouse, product, quantity] lists), while the algorithms can directly read the packed rows.
+
+        Class is defined by:
+            - data
+            - drone_rows
+            - indexed
+    """
+
+    """ Constructor """
+
+    def __init__(self, actions: Iterable[Action] = ()):
+        self.data = array('i')
+        # Row numbers of the actions of each drone, filled when a drone view is requested
+        self.drone_rows = {}
+        # Amount of rows already listed in drone_rows
+        self.indexed = 0
+
+        self.extend(actions)
+
+    def __len__(self) -> int:
+        return len(self.data) // FIELDS
+
+    def __getitem__(self, index: int | slice) -> Action | list[Action]:
+        """
+            - Decodes an action (or a slice of actions) as a list, like the lists used by the rest of the code
+            :return:        The action [drone, command, target, product, quantity]
+        """
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError('action index out of range')
+
+        return self.decode(self.data[index * FIELDS:(index + 1) * FIELDS])
+
+    def __iter__(self) -> Iterator[Action]:
+        for row in self.rows():
+            yield self.decode(row)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ActionBuffer):
+            return self.data == other.data
+        return list(self) == list(other)
+
+    def __getstate__(self) -> dict:
+        # The drone index is rebuilt when needed, no need to send it to the other processes
+        return {'data': self.data}
+
+    def __setstate__(self, state: dict) -> None:
+        self.data = state['data']
+        self.drone_rows = {}
+        self.indexed = 0
+
+    """ Static Method """
+    @staticmethod
+    def decode(row) -> Action:
+        """
+            - Decodes a packed row into an action list
+            :return:        The action [drone, command, target, product, quantity] ([drone, 'W', turns] for a wait)
+        """
+        if row[1] == WAIT:
+            return [row[0], 'W', row[2]]
+
+        return [row[0], COMMANDS[row[1]], row[2], row[3], row[4]]
+
+    def add(self, drone_id: int, opcode: int, target: int, product: int = 0, quantity: int = 0) -> None:
+        """
+            - Adds an action without creating its list
+        """
+        self.data.extend((drone_id, opcode, target, product, quantity))
+
+    def append(self, action: Action) -> None:
+        """
+            - Adds an action given as a list (same behaviour as list.append)
+        """
+        if action[1] == 'W':
+            self.data.extend((action[0], WAIT, action[2], 0, 0))
+        else:
+            self.data.extend((action[0], OPCODES[action[1]], action[2], action[3], action[4]))
+
+    def extend(self, actions: Iterable[Action], drone_id: int = None) -> None:
+        """
+            - Adds all the given actions. If a drone ID is given, the actions are given to this drone
+            - Another buffer is copied directly from its packed array
+        """
+        start = len(self.data)
+
+        if isinstance(actions, ActionBuffer):
+            self.data.extend(actions.data)
+        else:
+            for action in actions:
+                self.append(action)
+
+        # Relabelling the drone of the new actions in one go
+        if drone_id is not None:
+            count = (len(self.data) - start) // FIELDS
+            self.data[start::FIELDS] = array('i', [drone_id]) * count
+
+    def rows(self) -> Iterator[tuple[int, int, int, int, int]]:
+        """
+            - Iterates on the packed actions, without decoding them
+            - The columns are strided views on the array, so nothing is copied (the buffer cannot grow while
+              the iteration is not over)
+            :return:        Tuples (drone, opcode, target, product, quantity)
+        """
+        data = memoryview(self.data)
+        return zip(data[0::FIELDS], data[1::FIELDS], data[2::FIELDS], data[3::FIELDS], data[4::FIELDS])
+
+    def drones(self) -> list[int]:
+        """
+            - Lists the drones which have at least one action
+            :return:        The IDs of the drones, sorted
+        """
+        self.index()
+        return sorted(self.drone_rows.keys())
+
+    def for_drone(self, drone_id: int) -> 'DroneActions':
+        """
+            - Gives a view on the actions of a single drone, in the order of the buffer
+            - The actions are not copied, the view only stores their row numbers
+            :return:        The view on the actions of the drone
+        """
+        self.index()
+        return DroneActions(self, self.drone_rows.get(drone_id, array('i')))
+
+    def index(self) -> None:
+        """
+            - Lists the rows of each drone, for the actions added since the last call
+        """
+        data = self.data
+
+        for row in range(self.indexed, len(self)):
+            drone_id = data[row * FIELDS]
+            if drone_id not in self.drone_rows:
+                self.drone_rows[drone_id] = array('i')
+            self.drone_rows[drone_id].append(row)
+
+        self.indexed = len(self)
+
+    def lines(self) -> Iterator[str]:
+        """
+            - Formats every action as a line of the output file
+            :return:        The lines, without the line break
+        """
+        for row in self.rows():
+            yield format_action(*row)
+
+
+class DroneActions:
+    """
+        A view on the actions of one drone inside an action buffer. It behaves like a read-only list of actions.
+
+        Class is defined by:
+            - buffer
+            - row_numbers
+    """
+
+    """ Constructor """
+
+    def __init__(self, buffer: ActionBuffer, row_numbers: array):
+        self.buffer = buffer
+        self.row_numbers = row_numbers
+
+    def __len__(self) -> int:
+        return len(self.row_numbers)
+
+    def __getitem__(self, index: int) -> Action:
+        return self.buffer[self.row_numbers[index]]
+
+    def __iter__(self) -> Iterator[Action]:
+        for row in self.rows():
+            yield ActionBuffer.decode(row)
+
+    def rows(self) -> Iterator[tuple[int, int, int, int, int]]:
+        """
+            - Iterates on the packed actions of the drone, without decoding them
+            :return:        Tuples (drone, opcode, target, product, quantity)
+        """
+        data = self.buffer.data
+
+        for row in self.row_numbers:
+            start = row * FIELDS
+            yield data[start], data[start + 1], data[start + 2], data[start + 3], data[start + 4]
@@ -7,8 +7,14 @@ from utils.Warehouse import Warehouse
 from utils.Order import Order
 from utils.Drone import Drone
 from utils.types import Action, Location
+from array import array
+from copy import deepcopy
+from heapq import heapify, heappop, heappush, heapreplace
 from math import sqrt, ceil
 
+# Attributes which are never modified once built, shared by the copies of a challenge instead of being copied
+SHARED_ATTRIBUTES = {'location_rows', 'location_columns', 'distances', 'shared'}
+
 
 class Challenge:
     """
@@ -24,6 +30,11 @@ class Challenge:
             - warehouses
             - orders
             - drones
+            - drone_turns
+            - location_rows
+            - location_columns
+            - distances
+            - shared
     """
 
     """ Constructor """
@@ -39,9 +50,43 @@ class Challenge:
         self.orders = orders
         self.drones = []
 
-        # Generates the drones
+        # Distance matrix between the warehouses and all the locations (warehouses and orders), built on the first use
+        # Row of each warehouse location, and column of each location in the matrix
+        self.location_rows = None
+        self.location_columns = None
+        self.distances = None
+        # Shared challenge the distance matrix is read from, kept open with the challenge (see SharedChallenge)
+        self.shared = None
+        # Warehouse / order from its ID, built on the first use
+        self.warehouses_by_id = None
+        self.orders_by_id = None
+
+        # Generates the drones (sharing the distance matrix of the challenge)
         for i in range(drone_count):
-            self.drones.append(Drone(i, self.max_payload, self.warehouses[0].location))
+            self.drones.append(Drone(i, self.max_payload, self.warehouses[0].location, self.distance))
+
+        # Heap of the drones by available turn, one (available turn, drone ID) entry per drone. The drones update
+        # their available turn themselves, so an entry older than its drone is only replaced when it is read
+        self.drone_turns = [(drone.available_turn, drone.id) for drone in self.drones]
+        heapify(self.drone_turns)
+
+    def __deepcopy__(self, memo: dict) -> 'Challenge':
+        # The copies share the distance matrix (read-only), only the warehouses, orders and drones are copied
+        copy = Challenge.__new__(Challenge)
+        memo[id(self)] = copy
+
+        for name, value in self.__dict__.items():
+            setattr(copy, name, value if name in SHARED_ATTRIBUTES else deepcopy(value, memo))
+
+        return copy
+
+    def __getstate__(self) -> dict:
+        # A matrix read from shared memory can not be pickled, it is built again on the first use
+        state = dict(self.__dict__)
+        if self.shared is not None:
+            state.update(location_rows=None, location_columns=None, distances=None, shared=None)
+
+        return state
 
     def get_location(self, action: Action) -> Location:
         """
@@ -49,10 +94,92 @@ class Challenge:
             :return:        The location of the warehouse if the action is 'L' or 'U',
                             the location of the order if the action is not 'L' or 'U'
         """
+        if self.warehouses_by_id is None:
+            self.warehouses_by_id = {w.id: w for w in self.warehouses}
+            self.orders_by_id = {o.id: o for o in self.orders}
+
         if action[1] in {'L', 'U'}:
-            return list(filter(lambda w: w.id == action[2], self.warehouses))[0].location
+            return self.warehouses_by_id[action[2]].location
         else:
-            return list(filter(lambda o: o.id == action[2], self.orders))[0].location
+            return self.orders_by_id[action[2]].location
+
+    def earliest_drone(self) -> Drone:
+        """
+            - Fetches the drone which is available the earliest (the first one in case of equality)
+            :return:        The drone
+        """
+        return self.drones[self.fresh_drone_turn()[1]]
+
+    def arriving_drone(self, location: Location) -> tuple[int, Drone]:
+        """
+            - Fetches the drone which can be at a location the earliest (the first one available in case of
+              equality). The drones are taken from the heap by available turn, until they can not arrive before the
+              best one, then put back
+            :return:        The turn and the drone
+        """
+        best = None
+        taken = []
+
+        while self.drone_turns:
+            turn, drone_id = self.fresh_drone_turn()
+            if best is not None and turn >= best[0]:
+                break
+
+            drone = self.drones[drone_id]
+            arrival = drone.arrival_turn(location)
+            if best is None or arrival < best[0]:
+                best = (arrival, drone)
+
+            taken.append(heappop(self.drone_turns))
+
+        for entry in taken:
+            heappush(self.drone_turns, entry)
+
+        return best
+
+    def fresh_drone_turn(self) -> tuple[int, int]:
+        """
+            - Replaces the outdated entries at the top of the heap of the drones, until the top one is up to date
+              (the available turn of a drone only grows, so an outdated entry is always too early)
+            :return:        The available turn and the ID of the drone at the top of the heap
+        """
+        turn, drone_id = self.drone_turns[0]
+
+        while turn != self.drones[drone_id].available_turn:
+            heapreplace(self.drone_turns, (self.drones[drone_id].available_turn, drone_id))
+            turn, drone_id = self.drone_turns[0]
+
+        return turn, drone_id
+
+    def distance(self, location1: Location, location2: Location) -> int:
+        """
+            - Reads the distance between two locations in the distance matrix (computed if none of the locations
+              is a warehouse, or if a location is not a warehouse nor an order)
+            :return:        The distance
+        """
+        if self.distances is None:
+            self.build_distances()
+
+        rows, columns = self.location_rows, self.location_columns
+
+        if location1 in rows and location2 in columns:
+            return self.distances[rows[location1]][columns[location2]]
+        if location2 in rows and location1 in columns:
+            return self.distances[rows[location2]][columns[location1]]
+
+        return Challenge.calculate_distance(location1, location2)
+
+    def build_distances(self) -> None:
+        """
+            - Computes the distance between every warehouse and every location of warehouse or order (every trip
+              of a drone starts or ends at a warehouse, except when it delivers two orders in a row)
+        """
+        warehouses = list(dict.fromkeys(w.location for w in self.warehouses))
+        locations = list(dict.fromkeys([w.location for w in self.warehouses] + [o.location for o in self.orders]))
+
+        self.location_rows = {location: row for row, location in enumerate(warehouses)}
+        self.location_columns = {location: column for column, location in enumerate(locations)}
+        self.distances = [array('i', Challenge.distance_table([location], locations)) for location in warehouses]
 
     """ Static Method """
     @staticmethod
@@ -62,3 +189,11 @@ class Challenge:
             :return:        The distance
         """
         return ceil(sqrt((location1[0] - location2[0]) ** 2 + (location1[1] - location2[1]) ** 2))
+
+    @staticmethod
+    def distance_table(sources: list[Location], destinations: list[Location]) -> list[int]:
+        """
+            - Computes the distance between every source and every destination
+            :return:        The flat table of the distances, one row per source
+        """
+        return [Challenge.calculate_distance(a, b) for a in sources for b in destinations]
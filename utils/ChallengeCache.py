@@ -0,0 +1,145 @@
+"""
+@title : Challenge Cache
+@description : Class keeping the challenges already parsed by the server, published in shared memory
+"""
+
+from utils.SharedChallenge import SharedChallenge
+from collections import OrderedDict
+import hashlib
+import os
+
+
+class ChallengeCache:
+    """
+        A bounded LRU cache of the parsed challenges, keyed by the hash of their file. Every challenge is published
+        in shared memory (with its distance matrix) once, so the worker processes only receive its name. The shared
+        memory of a challenge is freed when it leaves the cache.
+        The cache is not thread safe, it is only used by the thread of the server.
+        The hash of a file is remembered with its size and modification time, so a file which has not changed is
+        not read again.
+        A challenge fetched with get (or added with put) is in use until it is released, and it is only freed once
+        it is not in use.
+
+        Class is defined by:
+            - max_size
+            - entries
+            - file_hashes
+            - users
+            - evicted
+            - hits
+            - misses
+    """
+
+    """ Constructor """
+
+    def __init__(self, max_size: int = 8):
+        self.max_size = max_size
+        # Hash of the file -> shared challenge
+        self.entries = OrderedDict()
+        # (path, size, modification time) -> hash of the file
+        self.file_hashes = {}
+        # Hash -> amount of requests using the challenge
+        self.users = {}
+        # Challenges out of the cache, but still in use
+        self.evicted = {}
+        self.hits = 0
+        self.misses = 0
+
+    """ Static Method """
+    @staticmethod
+    def text_hash(text: bytes) -> str:
+        """
+            - Hash of the content of a challenge file
+            :return:        The hexadecimal SHA-1 of the content
+        """
+        return hashlib.sha1(text).hexdigest()
+
+    def file_hash(self, filename: str) -> str:
+        """
+            - Hash of a challenge file, only read if it changed since the last time
+            :return:        The hexadecimal SHA-1 of the file
+        """
+        status = os.stat(filename)
+        key = (os.path.abspath(filename), status.st_size, status.st_mtime_ns)
+
+        if key not in self.file_hashes:
+            with open(filename, 'rb') as f:
+                self.file_hashes[key] = ChallengeCache.text_hash(f.read())
+
+        return self.file_hashes[key]
+
+    def get(self, key: str) -> SharedChallenge | None:
+        """
+            - Fetches the challenge of the given hash, which must be released once it is not used anymore
+            :return:        The challenge in shared memory, or None if it is not in the cache
+        """
+        # A challenge out of the cache but still in use is put back in the cache
+        shared = self.entries.get(key) or self.evicted.pop(key, None)
+
+        if shared is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries[key] = shared
+        self.entries.move_to_end(key)
+        self.users[key] = self.users.get(key, 0) + 1
+
+        return shared
+
+    def put(self, key: str, shared: SharedChallenge) -> None:
+        """
+            - Adds a challenge published in shared memory, which must be released once it is not used anymore
+        """
+        self.entries[key] = shared
+        self.users[key] = self.users.get(key, 0) + 1
+
+        # Freeing the least recently used challenges (or as soon as they are not in use anymore)
+        while len(self.entries) > self.max_size:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.evicted[evicted_key] = evicted
+            self.free(evicted_key)
+
+    def release(self, key: str) -> None:
+        """
+            - Marks a challenge fetched with get as not used anymore by its request
+        """
+        self.users[key] -= 1
+
+        if self.users[key] == 0:
+            del self.users[key]
+
+            if key in self.evicted:
+                self.free(key)
+
+    def free(self, key: str) -> None:
+        """
+            - Frees the shared memory of a challenge out of the cache, if no request is using it
+        """
+        if key not in self.users:
+            shared = self.evicted.pop(key)
+            shared.unlink()
+            shared.close()
+
+    def clear(self) -> None:
+        """
+            - Frees every challenge of the cache
+        """
+        for shared in list(self.entries.values()) + list(self.evicted.values()):
+            shared.unlink()
+            shared.close()
+
+        self.entries.clear()
+        self.evicted.clear()
+        self.users.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+            - Statistics of the cache
+            :return:        The amount of hits, misses and stored challenges
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+        }
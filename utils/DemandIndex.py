@@ -0,0 +1,125 @@
+"""
+@title : Demand Index
+@description : Class keeping the remaining demand of each product, and the orders needing it by distance
+"""
+
+from utils.Challenge import Challenge
+from utils.Warehouse import Warehouse
+from utils.Order import Order
+from utils.accel import get_numpy
+import heapq
+
+
+class DemandIndex:
+    """
+        A demand index keeps, for each product, the amount still needed by all the orders, and the orders needing
+        it sorted by their distance from a warehouse. The heap of a (warehouse, product) pair is only built the
+        first time it is requested, with one sort of the distances of the orders needing the product (a sorted
+        list already is a heap). The orders which do not need the product anymore are not removed from the heaps,
+        they are skipped when they reach the top.
+        The distances are read in the distance matrix of the challenge (vectorized with NumPy when it is installed).
+
+        Class is defined by:
+            - challenge
+            - orders
+            - product_orders
+            - totals
+            - heaps
+    """
+
+    """ Constructor """
+
+    def __init__(self, challenge: Challenge):
+        self.challenge = challenge
+        # Order from its ID
+        self.orders = {order.id: order for order in challenge.orders}
+        # Product -> IDs of the orders needing it (in the order of the challenge)
+        self.product_orders = {}
+        # Product -> amount still needed by all the orders
+        self.totals = {}
+        # (warehouse ID, product) -> heap of (distance from the warehouse, order ID)
+        self.heaps = {}
+
+        for order in challenge.orders:
+            for product, quantity in order.products.items():
+                if quantity > 0:
+                    self.product_orders.setdefault(product, []).append(order.id)
+                    self.totals[product] = self.totals.get(product, 0) + quantity
+
+    def total(self, product: int) -> int:
+        """
+            - Amount of a product still needed by all the orders
+            :return:        The amount
+        """
+        return self.totals.get(product, 0)
+
+    def products(self) -> list[int]:
+        """
+            - Products still needed, the most needed first
+            :return:        The products
+        """
+        return sorted((p for p, total in self.totals.items() if total > 0), key=lambda p: -self.totals[p])
+
+    def heap(self, warehouse: Warehouse, product: int) -> list[tuple[int, int]]:
+        """
+            - Orders needing a product, by distance from a warehouse (built on the first request)
+            - The heap is shared: entries popped and still needed must be pushed back (see push)
+            :return:        The heap of (distance, order ID)
+        """
+        key = (warehouse.id, product)
+
+        if key not in self.heaps:
+            order_ids = [o for o in self.product_orders.get(product, []) if self.orders[o].products[product] > 0]
+            self.heaps[key] = self._sorted_orders(warehouse, order_ids)
+
+        return self.heaps[key]
+
+    def nearest(self, warehouse: Warehouse, product: int) -> tuple[int, Order] | None:
+        """
+            - Removes from the heap the nearest order still needing a product
+            :return:        The distance and the order, or None if no order needs the product anymore
+        """
+        heap = self.heap(warehouse, product)
+
+        while heap:
+            distance, order_id = heapq.heappop(heap)
+            order = self.orders[order_id]
+
+            if order.products[product] > 0:
+                return distance, order
+
+        return None
+
+    def push(self, warehouse: Warehouse, product: int, distance: int, order: Order) -> None:
+        """
+            - Gives back an order taken with nearest, which still needs the product
+        """
+        heapq.heappush(self.heap(warehouse, product), (distance, order.id))
+
+    def deliver(self, product: int, quantity: int) -> None:
+        """
+            - Removes an amount delivered (or planned) from the total demand of a product
+        """
+        self.totals[product] -= quantity
+
+    def _sorted_orders(self, warehouse: Warehouse, order_ids: list[int]) -> list[tuple[int, int]]:
+        """
+            - Sorts orders by distance from a warehouse (ties by order ID, like the heap built from the list)
+            :return:        The list of (distance, order ID)
+        """
+        challenge = self.challenge
+        if challenge.distances is None:
+            challenge.build_distances()
+
+        row = challenge.distances[challenge.location_rows[warehouse.location]]
+        columns = [challenge.location_columns[self.orders[o].location] for o in order_ids]
+        np = get_numpy()
+
+        if np is None or not order_ids:
+            return sorted((row[c], o) for c, o in zip(columns, order_ids))
+
+        distances = np.frombuffer(row, dtype=np.int32)[np.asarray(columns, dtype=np.intp)]
+        ids = np.asarray(order_ids, dtype=np.int64)
+        ranks = np.lexsort((ids, distances))
+
+        return list(zip(distances[ranks].tolist(), ids[ranks].tolist()))
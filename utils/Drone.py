@@ -3,14 +3,18 @@
 @description : Class defining what is a drone
 """
 
-from utils.types import Action, Location
+from utils.types import Location
+from utils.ActionBuffer import ActionBuffer, LOAD, DELIVER, WAIT
 from utils.Order import Order
 from utils.Warehouse import Warehouse
+from typing import Callable
 
 
 class Drone:
     """
         A drone is here to transit certain products between warehouses and orders.
+        'available_turn' is the turn at which its last action is over, 'location' and 'current_load' are the ones
+        of the drone after it.
 
         Class is defined by:
             - id
@@ -19,17 +23,52 @@ class Drone:
             - current_load
             - available_turn
             - products
+            - distance
     """
 
     """ Constructor """
 
-    def __init__(self, drone_id: int, max_payload: int, location: Location):
+    def __init__(self, drone_id: int, max_payload: int, location: Location,
+                 distance: Callable[[Location, Location], int]):
         self.id = drone_id
         self.max_payload = max_payload
         self.location = location
         self.current_load = 0
         self.available_turn = 0
         self.products = {}
+        # Distance between two locations (the distance matrix of the challenge)
+        self.distance = distance
+
+    def move(self, location: Location, turns: int = 1) -> None:
+        """
+            - Flies to a location, then spends some turns there (1 for a load or a delivery)
+        """
+        self.available_turn += self.distance(self.location, location) + turns
+        self.location = location
+
+    def wait(self, turns: int, history: ActionBuffer = None) -> None:
+        """
+            - Waits some turns where the drone is (a 'W' action), so its available turn moves by these turns
+            - Update the history with the wait command if given
+        """
+        if history is not None:
+            history.add(self.id, WAIT, turns)
+        self.available_turn += turns
+
+    def follow(self, start: Location, end: Location, turns: int) -> None:
+        """
+            - Flies to the start of a list of actions (a segment) taking some turns, at the end of which the drone
+              is empty at the given location
+        """
+        self.available_turn += self.distance(self.location, start) + turns
+        self.location = end
+
+    def arrival_turn(self, location: Location) -> int:
+        """
+            - Earliest turn at which the drone can be at a location (after its last action)
+            :return:        The turn
+        """
+        return self.available_turn + self.distance(self.location, location)
 
     def can_load(self, product_type: int, quantity: int, product_weights: list[int]) -> bool:
         """
@@ -55,7 +94,7 @@ class Drone:
         return product in self.products and self.products[product] >= quantity
 
     def load(self, warehouse: Warehouse, product_type: int, quantity: int, product_weights: list[int],
-             history: list[Action]) -> None:
+             history: ActionBuffer) -> None:
         """
             - Try to load a specific quantity of a product from a warehouse
             - Update the history with the appropriate command if the drone has loaded the product
@@ -64,26 +103,26 @@ class Drone:
         # Updates the current weight of the drone
         self.current_load += total_weight
         # Adds the new instruction to the history
-        history.append([self.id, 'L', warehouse.id, product_type, quantity])
-        # Updates the current location
-        self.location = warehouse.location
+        history.add(self.id, LOAD, warehouse.id, product_type, quantity)
+        # Updates the current location and the available turn
+        self.move(warehouse.location)
         # Adds the products to the stocks of the drone
         self.products[product_type] = self.products.get(product_type, 0) + quantity
         # Removes the products from the warehouse's stocks
-        warehouse.products[product_type] -= quantity
+        warehouse.remove(product_type, quantity)
 
     def deliver(self, order: Order, product_type: int, quantity: int, product_weights: list[int],
-                history: list[Action]) -> None:
+                history: ActionBuffer) -> None:
         """
             - Update the solution with the appropriate command after the drone has delivered the product
         """
         # Removes the products from the order list
-        order.products[product_type] -= quantity
+        order.receive(product_type, quantity)
         # Lowers the drone current weight
         self.current_load -= quantity * product_weights[product_type]
         # Unload the drone
         self.products[product_type] -= quantity
         # Adds the new instruction to the history
-        history.append([self.id, 'D', order.id, product_type, quantity])
-        # Updates the current location
-        self.location = order.location
+        history.add(self.id, DELIVER, order.id, product_type, quantity)
+        # Updates the current location and the available turn
+        self.move(order.location)
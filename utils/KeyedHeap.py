@@ -0,0 +1,78 @@
+"""
+@title : Keyed Heap
+@description : Class defining a priority queue whose priorities can be changed
+"""
+
+from typing import Hashable
+from itertools import count
+import heapq
+
+
+class KeyedHeap:
+    """
+        A keyed heap is a priority queue of keys (the smallest priority first), where the priority of a key can be
+        updated in O(log n) by pushing it again. The old entries are not searched in the heap, they are only marked
+        as removed and skipped when they reach the top.
+
+        Class is defined by:
+            - heap
+            - entries
+            - counter
+    """
+
+    """ Constructor """
+
+    def __init__(self):
+        # Entries [priority, insertion number, key, alive], the insertion number keeping the ties in insertion order
+        self.heap = []
+        # Current entry of each key
+        self.entries = {}
+        self.counter = count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def push(self, key: Hashable, priority: float) -> None:
+        """
+            - Adds a key, or changes its priority if it is already in the heap
+        """
+        if key in self.entries:
+            self.entries[key][3] = False
+
+        entry = [priority, next(self.counter), key, True]
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+
+        # Rebuilding the heap when it is mostly made of removed entries
+        if len(self.heap) > 2 * len(self.entries) + 16:
+            self.heap = list(self.entries.values())
+            heapq.heapify(self.heap)
+
+    def peek(self) -> tuple[Hashable, float]:
+        """
+            - Fetches the key with the smallest priority, without removing it
+            :return:        The key and its priority
+        """
+        self._clean()
+        priority, _, key, _ = self.heap[0]
+        return key, priority
+
+    def pop(self) -> tuple[Hashable, float]:
+        """
+            - Removes the key with the smallest priority
+            :return:        The key and its priority
+        """
+        self._clean()
+        priority, _, key, _ = heapq.heappop(self.heap)
+        del self.entries[key]
+        return key, priority
+
+    def _clean(self) -> None:
+        """
+            - Drops the removed entries from the top of the heap
+        """
+        while self.heap and not self.heap[0][3]:
+            heapq.heappop(self.heap)
+
+        if not self.heap:
+            raise IndexError('pop from an empty heap')
@@ -4,6 +4,10 @@
 """
 
 from utils.types import Location
+from itertools import count
+
+# Global counter of the order versions, so two different states of an order never share the same version
+order_versions = count()
 
 
 class Order:
@@ -16,15 +20,26 @@ class Order:
             - location
             - amount
             - products
+            - version
         """
 
     """ Constructor """
 
     def __init__(self, order_id: int, location: Location, products: list[int]):
         self.id = order_id
-        self.initial_amount = sum(products)
+        # Amount of units of products ordered
+        self.initial_amount = len(products)
         self.location = location
         self.products = {product_type: products.count(product_type) for product_type in products}
+        # Changes every time the needed products change (copies of the order share it until one of them changes)
+        self.version = next(order_versions)
+
+    def receive(self, product_type: int, quantity: int) -> None:
+        """
+            - Removes a quantity of a product from the products still needed by the order
+        """
+        self.products[product_type] -= quantity
+        self.version = next(order_versions)
 
     def is_completed(self) -> bool:
         """
@@ -3,8 +3,9 @@
 @description : Class defining what is a segment
 """
 
-from utils.types import Action, Location
+from utils.types import Location
 from utils.Challenge import Challenge
+from utils.ActionBuffer import ActionBuffer
 
 
 class Segment:
@@ -22,7 +23,7 @@ class Segment:
 
     """ Constructor """
 
-    def __init__(self, start: Location, end: Location, challenge: Challenge, actions: list[Action], order_id: id):
+    def __init__(self, start: Location, end: Location, challenge: Challenge, actions: ActionBuffer, order_id: id):
         self.order_id = order_id
         self.start = start
         self.end = end
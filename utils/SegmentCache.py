@@ -0,0 +1,124 @@
+"""
+@title : Segment Cache
+@description : Class memorizing the segments already built for an order, depending on the stock it was built from
+"""
+
+from utils.Order import Order
+from utils.Warehouse import Warehouse
+from utils.Drone import Drone
+from utils.Segment import Segment
+from utils.ActionBuffer import LOAD, DELIVER
+from collections import OrderedDict
+
+
+class SegmentCache:
+    """
+        A bounded LRU cache of the segments built for the orders. A segment is stored with the version of the order,
+        the load of the drone building it (the products it still carries from the previous order are delivered
+        first), and the versions of every warehouse visited while building it. As long as they have not changed,
+        the same segment would be built again, so it can be reused instead.
+
+        Class is defined by:
+            - max_size
+            - entries
+            - hits
+            - misses
+            - invalidations
+    """
+
+    """ Constructor """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        # (order id, order version before, drone load before) -> (segment, warehouse versions before,
+        #                                                        order version after, warehouse versions after,
+        #                                                        drone products after, drone weight after)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def reuse(self, order: Order, warehouses: list[Warehouse], drone: Drone) -> Segment | None:
+        """
+            - Fetches the segment built for the order by a drone carrying the same products, if the stock it was
+              built from has not changed
+            - The segment is then applied on the stock and on the order, which get back the same versions as when
+              the segment was built (same stock and same actions give the same new stock), and the drone gets back
+              the products it was carrying after it
+            :return:        The cached segment, or None if there is no valid segment for the order
+        """
+        key = (order.id, order.version, drone_load(drone))
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            segment, dependencies, order_version, results, products, current_load = entry
+
+            # The segment is only valid if the visited warehouses have the same stock
+            if all(warehouses[warehouse_id].version == version for warehouse_id, version in dependencies.items()):
+                self.entries.move_to_end(key)
+                self.hits += 1
+
+                for _, opcode, target, product, quantity in segment.actions.rows():
+                    if opcode == LOAD:
+                        warehouses[target].remove(product, quantity)
+                    elif opcode == DELIVER:
+                        order.receive(product, quantity)
+
+                # Restoring the versions of the stock and the order, and the load of the drone
+                order.version = order_version
+                for warehouse_id, version in results.items():
+                    warehouses[warehouse_id].version = version
+                drone.products = dict(products)
+                drone.current_load = current_load
+
+                return segment
+
+            # The stock has changed since, the segment will never be valid again
+            del self.entries[key]
+            self.invalidations += 1
+
+        self.misses += 1
+        return None
+
+    def put(self, order: Order, order_version: int, load: tuple, dependencies: dict[int, int], segment: Segment,
+            warehouses: list[Warehouse], drone: Drone) -> None:
+        """
+            - Stores the segment which has just been built for an order
+            - order_version, load (see drone_load) and dependencies (the versions of the visited warehouses) are
+              taken before the segment was built, the current versions of the order and the warehouses and the
+              current load of the drone are the ones after it was built
+        """
+        key = (order.id, order_version, load)
+        results = {warehouse_id: warehouses[warehouse_id].version for warehouse_id in dependencies.keys()}
+        self.entries[key] = (segment, dependencies, order.version, results, dict(drone.products), drone.current_load)
+        self.entries.move_to_end(key)
+
+        # Removing the least recently used segments
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+            - Removes every segment from the cache
+        """
+        self.entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+            - Statistics of the cache
+            :return:        The amount of hits, misses, invalidations and stored segments
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'size': len(self.entries),
+        }
+
+
+def drone_load(drone: Drone) -> tuple[tuple[int, int], ...]:
+    """
+        - Products carried by a drone, in a form usable in a cache key
+        :return:        The (product, quantity) pairs of the carried products, sorted
+    """
+    return tuple(sorted((product, quantity) for product, quantity in drone.products.items() if quantity > 0))
@@ -0,0 +1,255 @@
+"""
+@title : Shared Challenge
+@description : Class publishing a parsed challenge in shared memory, so worker processes can read it without copies
+"""
+
+from utils.Challenge import Challenge
+from utils.Warehouse import Warehouse
+from utils.Order import Order
+from utils.accel import get_numpy
+from multiprocessing import shared_memory
+from array import array
+
+# Size of the integers stored in the shared memory (array type code 'i')
+ITEM_SIZE = array('i').itemsize
+
+
+class SharedChallenge:
+    """
+        A shared challenge stores the tables of a challenge in one block of shared memory, as 32 bits integers:
+            - header (rows, columns, drones, deadline, max payload)
+            - product_weights (one per product)
+            - warehouse_locations, order_locations (two per warehouse / order)
+            - order_ids (the ID of the order of each row, the orders of a challenge being any subset)
+            - stock (warehouses x products)
+            - order_offsets, order_items (the products of the order i are
+              order_items[order_offsets[i]:order_offsets[i + 1]], one item per unit, like in the input file)
+            - distances (warehouses x locations of the warehouses and the orders, see Challenge.build_distances)
+            - order_columns (the column of the location of each order in the distances)
+        Only the name of the block and the position of the tables are pickled, so sending a shared challenge to a
+        worker process costs a few bytes. The worker attaches the block by its name and reads the tables as read-only
+        NumPy arrays (or memoryviews without NumPy), and only copies what it modifies (see to_challenge).
+        The process creating the block must call unlink (or use it in a with block) once the workers are done, and
+        a worker must keep the block open (not call close) while it uses a challenge rebuilt from it.
+
+        Class is defined by:
+            - name
+            - layout
+            - memory
+            - owner
+    """
+
+    """ Constructor """
+
+    def __init__(self, name: str, layout: dict[str, tuple[int, int, tuple[int, ...]]], memory=None,
+                 owner: bool = False):
+        self.name = name
+        # Table name -> (offset in integers, amount of integers, shape)
+        self.layout = layout
+        self.memory = memory
+        self.owner = owner
+        # Views already created on the tables, and the memoryviews given to the challenges (released by close)
+        self.views = {}
+        self.exports = []
+
+    def __enter__(self) -> 'SharedChallenge':
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.unlink()
+        self.close()
+
+    def __del__(self) -> None:
+        # The memoryviews given to the challenges are released before the block is closed by its own finalizer
+        self.close()
+
+    def __getstate__(self) -> dict:
+        # Only the name and the layout are sent, the worker attaches the memory itself
+        return {'name': self.name, 'layout': self.layout}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state['name'], state['layout'])
+
+    """ Static Method """
+    @staticmethod
+    def publish(challenge: Challenge) -> 'SharedChallenge':
+        """
+            - Copies the tables of a challenge into a new block of shared memory
+            :return:        The shared challenge, owning the block
+        """
+        # Same rows and columns as the distance matrix of the challenge (see Challenge.build_distances)
+        sources = list(dict.fromkeys(w.location for w in challenge.warehouses))
+        locations = list(dict.fromkeys(sources + [o.location for o in challenge.orders]))
+        columns = {location: column for column, location in enumerate(locations)}
+        items = [[product for product, quantity in o.products.items() for _ in range(quantity)]
+                 for o in challenge.orders]
+
+        offsets = [0]
+        for order_items in items:
+            offsets.append(offsets[-1] + len(order_items))
+
+        tables = {
+            'header': ([challenge.rows_count, challenge.columns_count, len(challenge.drones), challenge.deadline,
+                        challenge.max_payload], (5,)),
+            'product_weights': (challenge.product_weights, (len(challenge.product_weights),)),
+            'warehouse_locations': ([c for w in challenge.warehouses for c in w.location],
+                                    (len(challenge.warehouses), 2)),
+            'order_locations': ([c for o in challenge.orders for c in o.location], (len(challenge.orders), 2)),
+            'order_ids': ([o.id for o in challenge.orders], (len(challenge.orders),)),
+            'stock': ([q for w in challenge.warehouses for q in w.products],
+                      (len(challenge.warehouses), len(challenge.product_weights))),
+            'order_offsets': (offsets, (len(offsets),)),
+            'order_items': ([p for order_items in items for p in order_items], (offsets[-1],)),
+            'distances': (Challenge.distance_table(sources, locations), (len(sources), len(locations))),
+            'order_columns': ([columns[o.location] for o in challenge.orders], (len(challenge.orders),)),
+        }
+
+        layout = {}
+        position = 0
+        for table, (values, shape) in tables.items():
+            layout[table] = (position, len(values), shape)
+            position += len(values)
+
+        memory = shared_memory.SharedMemory(create=True, size=max(1, position * ITEM_SIZE))
+        data = memory.buf.cast('i')
+
+        for table, (values, _) in tables.items():
+            start, size, _ = layout[table]
+            data[start:start + size] = array('i', values)
+
+        data.release()
+
+        return SharedChallenge(memory.name, layout, memory, owner=True)
+
+    def attach(self) -> None:
+        """
+            - Opens the block of shared memory (in a worker process)
+        """
+        if self.memory is None:
+            self.memory = shared_memory.SharedMemory(name=self.name)
+
+    def table(self, table: str):
+        """
+            - Gives a read-only view on a table, without copying it
+            :return:        A NumPy array of the shape of the table, or a flat memoryview of integers without NumPy
+        """
+        if table not in self.views:
+            self.attach()
+            start, size, shape = self.layout[table]
+            np = get_numpy()
+
+            if np is None:
+                self.views[table] = self.memory.buf.cast('i')[start:start + size].toreadonly()
+            else:
+                view = np.ndarray(shape, dtype=np.int32, buffer=self.memory.buf, offset=start * ITEM_SIZE)
+                view.flags.writeable = False
+                self.views[table] = view
+
+        return self.views[table]
+
+    def to_challenge(self, order_ids: list[int] = None, stock: list[list[int]] = None) -> Challenge:
+        """
+            - Rebuilds a challenge from the shared tables, with its own copy of the stock and of the needs of the
+              orders (the only data modified by the algorithms)
+            - The distance matrix is not copied: its rows are read-only memoryviews on the shared block, which must
+              stay open while the challenge is used (the challenge keeps the shared challenge in its shared attribute)
+            - A zone can be rebuilt by giving the IDs of its orders (their IDs in the published challenge, not their
+              rows), and the stock reserved for it
+            :return:        The challenge
+        """
+        rows, columns, drone_count, deadline, max_payload = (int(v) for v in self.table('header'))
+        product_weights = [int(w) for w in flat(self.table('product_weights'))]
+        product_count = len(product_weights)
+
+        warehouse_locations = [int(v) for v in flat(self.table('warehouse_locations'))]
+        stock_table = [int(v) for v in flat(self.table('stock'))] if stock is None else None
+        warehouses = [
+            Warehouse(
+                w, (warehouse_locations[2 * w], warehouse_locations[2 * w + 1]),
+                stock_table[w * product_count:(w + 1) * product_count] if stock is None else list(stock[w])
+            )
+            for w in range(len(warehouse_locations) // 2)
+        ]
+
+        order_locations = flat(self.table('order_locations'))
+        offsets = flat(self.table('order_offsets'))
+        items = self.table('order_items')
+        order_columns = self.table('order_columns')
+
+        # Row of each order in the tables, from its ID
+        ids = [int(o) for o in self.table('order_ids')]
+        order_rows = {order_id: row for row, order_id in enumerate(ids)}
+
+        if order_ids is None:
+            order_ids = ids
+
+        rows_of_orders = [order_rows[o] for o in order_ids]
+        orders = [
+            Order(o, (int(order_locations[2 * r]), int(order_locations[2 * r + 1])),
+                  [int(p) for p in items[offsets[r]:offsets[r + 1]]])
+            for o, r in zip(order_ids, rows_of_orders)
+        ]
+
+        challenge = Challenge(rows, columns, drone_count, deadline, max_payload, product_weights, warehouses, orders)
+
+        # Rows and columns of the shared distance matrix (see publish), only for the locations of this challenge
+        sources = list(dict.fromkeys(w.location for w in warehouses))
+        challenge.location_rows = {location: row for row, location in enumerate(sources)}
+        challenge.location_columns = {location: column for column, location in enumerate(sources)}
+        challenge.location_columns.update((o.location, int(order_columns[r])) for o, r in zip(orders, rows_of_orders))
+        challenge.distances = self.distance_rows()
+        challenge.shared = self
+
+        return challenge
+
+    def distance_rows(self) -> list[memoryview]:
+        """
+            - Gives the rows of the distance matrix as read-only memoryviews on the shared block, without copying them
+              (reading a memoryview gives Python integers, faster to add to the turns than NumPy scalars)
+            :return:        The rows, one per warehouse location
+        """
+        if 'distance_rows' not in self.views:
+            self.attach()
+            start, _, (row_count, column_count) = self.layout['distances']
+            data = self.memory.buf.cast('i')
+            self.views['distance_rows'] = [
+                data[start + row * column_count:start + (row + 1) * column_count].toreadonly()
+                for row in range(row_count)
+            ]
+            self.exports.append(data)
+            self.exports.extend(self.views['distance_rows'])
+
+        return self.views['distance_rows']
+
+    def close(self) -> None:
+        """
+            - Closes the block in this process (the views on it, and the challenges rebuilt from it, must not be used
+              anymore)
+        """
+        self.views = {}
+
+        # The memoryviews given to the challenges would prevent the block from being closed
+        for view in self.exports:
+            view.release()
+        self.exports = []
+
+        if self.memory is not None:
+            self.memory.close()
+            self.memory = None
+
+    def unlink(self) -> None:
+        """
+            - Destroys the block, once every process is done with it (only for the process which created it)
+        """
+        if self.owner:
+            self.attach()
+            self.memory.unlink()
+            self.owner = False
+
+
+def flat(table):
+    """
+        - Flattens a NumPy view (the memoryviews already are flat)
+        :return:        The flat table
+    """
+    return table.reshape(-1) if hasattr(table, 'reshape') else table
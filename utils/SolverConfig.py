@@ -0,0 +1,95 @@
+"""
+@title : Solver Config
+@description : Class defining the tunable constants of the algorithms
+"""
+
+import json
+import os
+
+
+class SolverConfig:
+    """
+        The constants used by the algorithms, which can be tuned for each dataset (see tuner.py) and saved in a
+        profile file, loaded by main.py.
+
+        Class is defined by:
+            - longer_than_order_ratio (workload_repartition: how much longer a detour to another warehouse can be)
+            - ratio_order_completion (workload_repartition: importance of the order completion against the
+              length of the segment while choosing the next segment)
+            - nb_zones (layers: amount of zones, None to choose it automatically)
+    """
+
+    """ Constructor """
+
+    def __init__(self, longer_than_order_ratio: float = 3, ratio_order_completion: float = 0.2,
+                 nb_zones: int = None):
+        self.longer_than_order_ratio = longer_than_order_ratio
+        self.ratio_order_completion = ratio_order_completion
+        self.nb_zones = nb_zones
+
+    def __repr__(self) -> str:
+        return f'SolverConfig({", ".join(f"{key}={value!r}" for key, value in self.to_dict().items())})'
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SolverConfig) and self.to_dict() == other.to_dict()
+
+    def to_dict(self) -> dict:
+        """
+            - Converts the config into a dict, which can be saved as JSON
+            :return:        The constants, by name
+        """
+        return {
+            'longer_than_order_ratio': self.longer_than_order_ratio,
+            'ratio_order_completion': self.ratio_order_completion,
+            'nb_zones': self.nb_zones,
+        }
+
+    def key(self) -> str:
+        """
+            - Unique text representation of the config, used as a cache key
+            :return:        The key
+        """
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    """ Static Method """
+    @staticmethod
+    def from_dict(values: dict) -> 'SolverConfig':
+        """
+            - Creates a config from a dict, the missing constants keeping their default value
+            :return:        The config
+        """
+        return SolverConfig(**{key: value for key, value in values.items() if key in SolverConfig().to_dict()})
+
+    @staticmethod
+    def load_profile(filename: str, dataset: str) -> 'SolverConfig':
+        """
+            - Loads the config of a dataset from a profile file ({dataset name: config and algorithm}), or its
+              'default' config if the dataset has no config of its own
+            :return:        The config
+        """
+        return SolverConfig.from_dict(SolverConfig.profile_entry(filename, dataset))
+
+    @staticmethod
+    def load_profile_strategy(filename: str, dataset: str) -> str | None:
+        """
+            - Fetches the algorithm the config of a dataset was tuned for (see load_profile)
+            :return:        The name of the algorithm, or None if the profile does not give it
+        """
+        return SolverConfig.profile_entry(filename, dataset).get('strategy')
+
+    @staticmethod
+    def profile_entry(filename: str, dataset: str) -> dict:
+        """
+            - Reads the entry of a dataset in a profile file, or its 'default' entry
+            :return:        The entry (constants, and the algorithm they were tuned for)
+        """
+        with open(filename, 'r') as f:
+            profile = json.load(f)
+
+        name = os.path.basename(dataset)
+
+        return profile.get(name, profile.get('default', {}))
+
+
+# Config used when none is given
+DEFAULT_CONFIG = SolverConfig()
@@ -4,6 +4,10 @@
 """
 
 from utils.types import Location
+from itertools import count
+
+# Global counter of the stock versions, so two different stocks never share the same version
+stock_versions = count()
 
 
 class Warehouse:
@@ -12,6 +16,7 @@ class Warehouse:
         - id
         - location
         - products
+        - version
     """
 
     """ Constructor """
@@ -20,3 +25,12 @@ class Warehouse:
         self.id = warehouse_id
         self.location = location
         self.products = products
+        # Changes every time the stock changes (copies of the warehouse share it until one of them changes)
+        self.version = next(stock_versions)
+
+    def remove(self, product_type: int, quantity: int) -> None:
+        """
+            - Removes a quantity of a product from the stock of the warehouse
+        """
+        self.products[product_type] -= quantity
+        self.version = next(stock_versions)
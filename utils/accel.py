@@ -0,0 +1,46 @@
+"""
+@title : Accelerators
+@description : Lazily loads the optional numerical backends, so they are only imported when an algorithm needs them
+"""
+
+# Sentinel used to know if the import has already been attempted
+_NOT_LOADED = object()
+
+_numpy = _NOT_LOADED
+
+
+def get_numpy():
+    """
+        - Imports NumPy the first time it is requested
+        :return:        The numpy module, or None if it is not installed
+    """
+    global _numpy
+
+    if _numpy is _NOT_LOADED:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = None
+
+    return _numpy
+
+
+_numba = _NOT_LOADED
+
+
+def get_numba():
+    """
+        - Imports Numba the first time it is requested
+        :return:        The numba module, or None if it is not installed
+    """
+    global _numba
+
+    if _numba is _NOT_LOADED:
+        try:
+            import numba
+            _numba = numba
+        except ImportError:
+            _numba = None
+
+    return _numba
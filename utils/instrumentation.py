@@ -0,0 +1,22 @@
+"""
+@title : Instrumentation
+@description : Collects the statistics of the different components, so they can be reported by the server
+"""
+
+# Components registered for the report, by name
+sources = {}
+
+
+def register(name: str, source) -> None:
+    """
+        - Registers a component for the report. The component must have a 'stats()' method returning a dict
+    """
+    sources[name] = source
+
+
+def report() -> dict[str, dict]:
+    """
+        - Fetches the current statistics of every registered component
+        :return:        The statistics of each component, by name
+    """
+    return {name: source.stats() for name, source in sources.items()}